@@ -3,11 +3,15 @@
 from collections import defaultdict
 from dataclasses import dataclass
 import datetime as dt
+import functools
 import importlib
+import json
 import logging
+import os
 from pathlib import Path
 import pkgutil
 import random
+import stat
 import tarfile
 import tempfile
 import time
@@ -16,7 +20,11 @@ import uuid
 import zipfile
 
 import enlighten
-import puremagic
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 import formats
 
@@ -119,7 +127,12 @@ def safe_path(path: Path | str, max_name_length: int = 50) -> Path | str:
     return safe_name if isinstance(path, str) else path.with_name(safe_name)
 
 
+@functools.lru_cache(maxsize=1)
 def get_available_formats() -> dict:
+    """
+    Get all formats and their accepted inputs. Importing all format modules is
+    expensive, so the result is cached. Don't modify it.
+    """
     formats_dict = {}
     for module in pkgutil.iter_modules(formats.__path__):
         module_ = importlib.import_module(f"formats.{module.name}")
@@ -132,6 +145,25 @@ def get_available_formats() -> dict:
     return formats_dict
 
 
+def url_stem(url: str) -> str:
+    """
+    Get the file name without suffix of an url, like Path(url).stem.
+    Splitting the string is much faster than creating a path.
+
+    >>> url_stem("folder/note.md")
+    'note'
+    >>> url_stem("archive.tar.gz")
+    'archive.tar'
+    >>> url_stem(".hidden")
+    '.hidden'
+    >>> url_stem("folder/")
+    'folder'
+    """
+    name = url.rstrip("/").rsplit("/", 1)[-1]
+    stem, _, suffix = name.rpartition(".")
+    return stem if stem and suffix else name
+
+
 def guess_suffix(file_: Path) -> str:
     """
     >>> guess_suffix(Path(__file__))
@@ -141,6 +173,8 @@ def guess_suffix(file_: Path) -> str:
     >>> guess_suffix(Path("non/existing.txt"))
     ''
     """
+    import puremagic  # pylint: disable=import-outside-toplevel
+
     try:
         guessed_suffix = puremagic.from_file(file_)
         # regular jpg files seem to be guessed as jfif sometimes
@@ -151,6 +185,29 @@ def guess_suffix(file_: Path) -> str:
         return ""
 
 
+# Known image suffixes don't need to be sniffed by puremagic.
+# fmt: off
+IMAGE_SUFFIXES = (
+    ".bmp", ".gif", ".jpeg", ".jpg", ".png", ".svg", ".tif", ".tiff", ".webp",
+)
+# fmt: on
+
+
+@functools.lru_cache(maxsize=4096)
+def sniff_is_image(file_: Path, _mtime_ns: int) -> bool:
+    """
+    Check the mime type of a file by its content. The result is cached,
+    because resources are often referenced multiple times.
+    The modification time is part of the cache key to detect changed files.
+    """
+    import puremagic  # pylint: disable=import-outside-toplevel
+
+    try:
+        return puremagic.from_file(file_, mime=True).startswith("image/")
+    except (FileNotFoundError, IsADirectoryError, puremagic.main.PureError, ValueError):
+        return False
+
+
 def is_image(file_: Path) -> bool:
     """
     >>> is_image(Path(__file__))
@@ -159,11 +216,18 @@ def is_image(file_: Path) -> bool:
     False
     >>> is_image(Path("non/existing.txt"))
     False
+    >>> is_image(Path("non/existing.png"))
+    False
     """
     try:
-        return puremagic.from_file(file_, mime=True).startswith("image/")
-    except (FileNotFoundError, IsADirectoryError, puremagic.main.PureError, ValueError):
+        stat_result = file_.stat()
+    except OSError:
+        return False
+    if not stat.S_ISREG(stat_result.st_mode):
         return False
+    if file_.suffix.lower() in IMAGE_SUFFIXES:
+        return True
+    return sniff_is_image(file_, stat_result.st_mtime_ns)
 
 
 def try_transfer_dicts(source: dict, target: dict, keys: list[str | tuple[str, str]]):
@@ -278,9 +342,54 @@ def get_import_stats(parents: list, stats: Stats | None = None) -> Stats:
 ###########################################################
 
 
+def scandir_sorted(folder: Path) -> list[os.DirEntry]:
+    """
+    Return the entries of a folder, sorted by name.
+    The entries cache the file type, so no additional stat() calls are needed.
+    """
+    with os.scandir(folder) as entries:
+        return sorted(entries, key=lambda entry: entry.name)
+
+
+def read_text_file(file_: Path) -> str:
+    """
+    Read a UTF-8 text file. Faster than Path.read_text(), since the newlines
+    are only translated if there are carriage returns.
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile(suffix=".md") as file_:
+    ...     _ = file_.write(b"a\\r\\nb\\rc\\xff")
+    ...     file_.flush()
+    ...     read_text_file(Path(file_.name))
+    'a\\nb\\nc\ufffd'
+    """
+    text = file_.read_bytes().decode("utf-8", "replace")
+    if "\r" in text:
+        # universal newlines, like in text mode
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+def read_json_file(file_: Path) -> Any:
+    """
+    Read a JSON file. Use orjson if available, since it's much faster.
+
+    >>> import tempfile
+    >>> with tempfile.NamedTemporaryFile(suffix=".json") as file_:
+    ...     _ = file_.write('{"title": "\u00fc"}'.encode("utf-8"))
+    ...     file_.flush()
+    ...     read_json_file(Path(file_.name))
+    {'title': '\u00fc'}
+    """
+    if orjson is not None:
+        return orjson.loads(file_.read_bytes())
+    return json.loads(file_.read_bytes())
+
+
 def get_single_child_folder(parent_folder: Path) -> Path:
     """If there is only a single subfolder, return it."""
-    child_folders = [f for f in parent_folder.iterdir() if f.is_dir()]
+    with os.scandir(parent_folder) as entries:
+        child_folders = [Path(entry.path) for entry in entries if entry.is_dir()]
     assert len(child_folders) == 1
     return child_folders[0]
 
@@ -314,8 +423,55 @@ def extract_zip(
     return temp_folder
 
 
-def find_file_recursively(root_folder: Path, url: str) -> Path | None:
-    potential_matches = sorted(root_folder.rglob(url))
+def index_files_recursively(root_folder: Path) -> dict[str, list[Path]]:
+    """
+    Map all file names and relative paths in a folder to the matching files.
+    For example "a/b/c.png" is accessible by "c.png", "b/c.png" and "a/b/c.png".
+    Walking the folder once is much faster than searching it for each file.
+    The keys are case-normalized, since the file system may be case-insensitive.
+    """
+    file_index = defaultdict(list)
+    for dirpath, _, filenames in os.walk(root_folder):
+        folder = Path(dirpath)
+        relative_parts = folder.relative_to(root_folder).parts
+        for filename in filenames:
+            parts = (*relative_parts, filename)
+            for index in range(len(parts)):
+                file_index[os.path.normcase("/".join(parts[index:]))].append(
+                    folder / filename
+                )
+    for matches in file_index.values():
+        matches.sort()
+    return dict(file_index)
+
+
+def find_file_recursively(
+    root_folder: Path, url: str, file_index: dict[str, list[Path]] | None = None
+) -> Path | None:
+    """
+    Find a file in a folder by its name or by the end of its relative path.
+    If the folder was indexed already, provide the index for a fast lookup.
+    """
+    if file_index is None:
+        # Compare the names directly. rglob() would interpret the url as pattern.
+        url_parts = tuple(os.path.normcase(part) for part in Path(url).parts)
+        potential_matches = []
+        for dirpath, _, filenames in os.walk(root_folder):
+            for filename in filenames:
+                if not url_parts or os.path.normcase(filename) != url_parts[-1]:
+                    continue
+                relative_folder = Path(dirpath).relative_to(root_folder)
+                relative_parts = (*relative_folder.parts, filename)
+                if (
+                    tuple(map(os.path.normcase, relative_parts[-len(url_parts) :]))
+                    == url_parts
+                ):
+                    potential_matches.append(Path(dirpath, filename))
+        potential_matches.sort()
+    else:
+        potential_matches = file_index.get(
+            os.path.normcase("/".join(Path(url).parts)), []
+        )
     if not potential_matches:
         LOGGER.debug(f"Couldn't find match for resource {url}")
         return None
@@ -329,15 +485,6 @@ def find_file_recursively(root_folder: Path, url: str) -> Path | None:
 ###########################################################
 
 
-def get_ctime_mtime_ms(item: Path) -> dict:
-    data = {}
-    if (ctime_ms := int(item.stat().st_ctime * 1000)) > 0:
-        data["created"] = ctime_ms
-    if (mtime_ms := int(item.stat().st_mtime * 1000)) > 0:
-        data["updated"] = mtime_ms
-    return data
-
-
 def datetime_to_ms(datetime_: dt.datetime) -> int:
     return int(datetime_.timestamp() * 1000)
 
@@ -2,8 +2,10 @@
 
 import abc
 import logging
+import os
 from pathlib import Path
 import subprocess
+import tempfile
 
 import common
 import intermediate_format as imf
@@ -21,6 +23,8 @@ class BaseConverter(abc.ABC):
         self.format = "Jimmy" if config.format is None else config.format
         self.root_notebook: imf.Notebook
         self.root_path: Path
+        # optional index of all files in the root path, see find_file_recursively()
+        self.file_index: dict[str, list[Path]] | None = None
         self.output_folder = config.output_folder
 
     def prepare_input(self, input_: Path) -> Path:
@@ -104,6 +108,8 @@ class DefaultConverter(BaseConverter):
         super().__init__(*args, **kwargs)
         # we need a resource folder to avoid writing files to the source folder
         self.resource_folder = common.get_temp_folder()
+        # asciidoc files converted in advance, see convert_asciidoc_files()
+        self.asciidoc_html_files: dict[Path, Path] = {}
 
     def handle_markdown_links(
         self, body: str, path
@@ -122,10 +128,97 @@ class DefaultConverter(BaseConverter):
                     # TODO: this could be a resource, too. How to distinguish?
                     # internal link
                     note_links.append(
-                        imf.NoteLink(str(link), Path(link.url).stem, link.text)
+                        imf.NoteLink(str(link), common.url_stem(link.url), link.text)
                     )
         return resources, note_links
 
+    @staticmethod
+    def find_asciidoc_files(folder: Path, output_folder: Path) -> dict[Path, Path]:
+        """
+        Find the asciidoc files of a folder and their output file of
+        the batch conversion. Files that can't be converted in a batch are skipped.
+        """
+        resolved_folder = folder.resolve()
+        # asciidoctor keeps the folder structure and replaces the suffix
+        source_files_by_html_file: dict[Path, list[Path]] = {}
+        for current_folder, _, file_names in os.walk(folder):
+            for file_name in file_names:
+                if not file_name.lower().endswith((".adoc", ".asciidoc")):
+                    continue
+                source_file = Path(current_folder, file_name).resolve()
+                try:
+                    relative_path = source_file.relative_to(resolved_folder)
+                except ValueError:
+                    # A symlink to a file outside of the folder.
+                    # It's converted separately.
+                    continue
+                source_files_by_html_file.setdefault(
+                    (output_folder / relative_path).with_suffix(".html"), []
+                ).append(source_file)
+        # Files like "a.adoc" and "a.asciidoc" would overwrite each other's output.
+        # They are converted separately.
+        return {
+            source_files[0]: html_file
+            for html_file, source_files in source_files_by_html_file.items()
+            if len(source_files) == 1
+        }
+
+    def convert_asciidoc_files(self, folder: Path, output_folder: Path):
+        """
+        Convert all asciidoc files of a folder to HTML by a single asciidoctor call.
+        Starting asciidoctor is much more expensive than converting a file.
+        """
+        html_files = self.find_asciidoc_files(folder, output_folder)
+        source_files = list(html_files)
+        if len(source_files) < 2:
+            return
+        # Limit the number of files per call. The command line length is limited.
+        chunk_size = 100
+        for index in range(0, len(source_files), chunk_size):
+            chunk = source_files[index : index + chunk_size]
+            # fmt: off
+            try:
+                subprocess.run(
+                    [
+                        "asciidoctor",
+                        "--attribute", "nofooter",
+                        "--backend", "html",
+                        # keep the folder structure to avoid name conflicts
+                        "--source-dir", str(folder.resolve()),
+                        "--destination-dir", str(output_folder),
+                        *[str(file_) for file_ in chunk],
+                    ],
+                    check=True,
+                    capture_output=True,
+                )
+            except (OSError, subprocess.CalledProcessError) as exc:
+                # fall back to converting the files one by one
+                self.logger.debug(f"Batch conversion of asciidoc files failed: {exc}")
+                continue
+            # fmt: on
+            for file_ in chunk:
+                if (html_file := html_files[file_]).is_file():
+                    self.asciidoc_html_files[file_] = html_file
+
+    def asciidoc_to_html(self, file_: Path) -> str:
+        """Convert an asciidoc file to HTML. Use the batch conversion if possible."""
+        if (html_file := self.asciidoc_html_files.get(file_.resolve())) is not None:
+            return html_file.read_text(encoding="utf-8")
+        # fmt: off
+        note_body_html = subprocess.check_output(
+            [
+                "asciidoctor",
+                # Don't generate the "last updated" footer.
+                # https://stackoverflow.com/a/41777672/7410886
+                "--attribute", "nofooter",
+                "--backend", "html",
+                "--out-file", "-",
+                str(file_.resolve()),
+            ]
+        )
+        # fmt: on
+        return note_body_html.decode("utf8")
+
     def convert_file(self, file_: Path, parent: imf.Notebook):
         """Default conversion function for files. Uses pandoc directly."""
         match file_.suffix.lower():
@@ -136,21 +229,8 @@ class DefaultConverter(BaseConverter):
                 # https://docs.asciidoctor.org/asciidoc/latest/document/title/
                 # However, we want everything in the note body. Thus, we need
                 # to use HTML (instead of docbook) as intermediate format.
-                # fmt: off
-                note_body_html = subprocess.check_output(
-                    [
-                        "asciidoctor",
-                        # Don't generate the "last updated" footer.
-                        # https://stackoverflow.com/a/41777672/7410886
-                        "--attribute", "nofooter",
-                        "--backend", "html",
-                        "--out-file", "-",
-                        str(file_.resolve()),
-                    ]
-                )
-                # fmt: on
                 note_body = markdown_lib.common.markup_to_markdown(
-                    note_body_html.decode("utf8")
+                    self.asciidoc_to_html(file_)
                 )
             case ".eml":
                 note_imf = markdown_lib.eml.eml_to_note(file_, self.resource_folder)
@@ -159,10 +239,10 @@ class DefaultConverter(BaseConverter):
             case ".fountain":
                 # Simply wrap in a code block. This is supported in
                 # Joplin and Obsidian via plugins.
-                note_body_fountain = file_.read_text(encoding="utf-8")
+                note_body_fountain = common.read_text_file(file_)
                 note_body = f"```fountain\n{note_body_fountain}\n```\n"
             case ".md" | ".markdown" | ".txt" | ".text":
-                note_body = file_.read_text(encoding="utf-8")
+                note_body = common.read_text_file(file_)
             case _:
                 note_body = markdown_lib.common.file_to_markdown(
                     file_, self.resource_folder
@@ -179,38 +259,55 @@ class DefaultConverter(BaseConverter):
         note_imf.time_from_file(file_)
         parent.child_notes.append(note_imf)
 
-    def convert_file_or_folder(self, file_or_folder: Path, parent: imf.Notebook):
+    def try_convert_file(self, file_: Path, parent: imf.Notebook):
+        """Convert a single file and log the result."""
+        if not file_.suffix.lower():
+            # We can't guess the extansion, so we can ignore it.
+            self.logger.debug(f"ignored {file_.name}: No extension.")
+            return
+        try:
+            self.convert_file(file_, parent)
+            self.logger.debug(f"ok   {file_.name}")
+        except Exception as exc:  # pylint: disable=broad-except
+            self.logger.debug(f"fail {file_.name}: {str(exc).strip()[:120]}")
+
+    def convert_folder(self, folder: Path, parent: imf.Notebook):
         """Default conversion function for folders."""
-        if file_or_folder.is_file():
-            if not file_or_folder.suffix.lower():
-                # We can't guess the extansion, so we can ignore it.
-                self.logger.debug(f"ignored {file_or_folder.name}: No extension.")
-                return
-            try:
-                self.convert_file(file_or_folder, parent)
-                self.logger.debug(f"ok   {file_or_folder.name}")
-            except Exception as exc:  # pylint: disable=broad-except
-                self.logger.debug(
-                    f"fail {file_or_folder.name}: {str(exc).strip()[:120]}"
-                )
-        else:
-            self.logger.debug(f"entering folder {file_or_folder.name}")
-            new_parent = imf.Notebook(file_or_folder.stem)
-            folders = []
-            for item in sorted(file_or_folder.iterdir()):
-                if item.is_file():
-                    self.convert_file_or_folder(item, new_parent)
+        # Walk the folders iteratively. The notebooks are linked to their parent
+        # immediately, so the order of processing doesn't matter.
+        # The sorting is needed for a deterministic order of the notes and notebooks.
+        # Only the names are compared and paths are created only when needed.
+        stack: list[tuple[str | Path, imf.Notebook]] = [(folder, parent)]
+        while stack:
+            current_folder, current_parent = stack.pop()
+            current_folder = Path(current_folder)
+            self.logger.debug(f"entering folder {current_folder.name}")
+            new_parent = imf.Notebook(current_folder.stem)
+            current_parent.child_notebooks.append(new_parent)
+            subfolders = []
+            for entry in common.scandir_sorted(current_folder):
+                if entry.is_file():
+                    self.try_convert_file(Path(entry.path), new_parent)
                 else:
                     # Delay processing folders to have a better readable log. I. e.
                     # folder 1 - file 1, file 2, file 3
                     # folder 2 - file 1, file 2, file 3
-                    # TODO: check if there is a better way
-                    folders.append(item)
-            for folder in folders:
-                self.convert_file_or_folder(folder, new_parent)
-            parent.child_notebooks.append(new_parent)
+                    subfolders.append((entry.path, new_parent))
+            # reversed, to process the first subfolder next
+            stack.extend(reversed(subfolders))
+
+    def convert_file_or_folder(self, file_or_folder: Path, parent: imf.Notebook):
+        if file_or_folder.is_file():
+            self.try_convert_file(file_or_folder, parent)
+        else:
+            self.convert_folder(file_or_folder, parent)
 
     def convert(self, file_or_folder: Path):
-        self.convert_file_or_folder(file_or_folder, self.root_notebook)
+        # The HTML files of the asciidoc batch are read when converting the notes.
+        with tempfile.TemporaryDirectory() as asciidoc_folder:
+            if file_or_folder.is_dir():
+                self.convert_asciidoc_files(file_or_folder, Path(asciidoc_folder))
+            self.convert_file_or_folder(file_or_folder, self.root_notebook)
+            self.asciidoc_html_files.clear()
         # Don't export empty notebooks
         self.remove_empty_notebooks()
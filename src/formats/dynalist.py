@@ -8,14 +8,18 @@ import intermediate_format as imf
 import markdown_lib
 
 
-def handle_markdown_links(body: str, root_folder: Path) -> imf.NoteLinks:
+def handle_markdown_links(
+    body: str, root_folder: Path, file_index: dict[str, list[Path]] | None = None
+) -> imf.NoteLinks:
     note_links = []
     for link in markdown_lib.common.get_markdown_links(body):
         if link.url.startswith("https://dynalist.io/d"):
             # Most likely internal link. We can only try to match against the name
             # (that might be modified in the meantime).
             if (
-                common.find_file_recursively(root_folder, f"{link.text}.txt")
+                common.find_file_recursively(
+                    root_folder, f"{link.text}.txt", file_index
+                )
                 is not None
             ):
                 note_links.append(imf.NoteLink(str(link), link.text, link.text))
@@ -49,7 +53,9 @@ class Converter(converter.BaseConverter):
             imf.Tag(tag)
             for tag in markdown_lib.common.get_inline_tags(note_imf.body, ["#", "@"])
         ]
-        note_imf.note_links = handle_markdown_links(note_imf.body, self.root_path)
+        note_imf.note_links = handle_markdown_links(
+            note_imf.body, self.root_path, self.file_index
+        )
         parent.child_notes.append(note_imf)
 
     def convert_folder(self, folder: Path, parent: imf.Notebook):
@@ -62,4 +68,5 @@ class Converter(converter.BaseConverter):
                 parent.child_notebooks.append(new_parent)
 
     def convert(self, file_or_folder: Path):
+        self.file_index = common.index_files_recursively(self.root_path)
         self.convert_folder(self.root_path, self.root_notebook)
@@ -2,16 +2,18 @@
 
 import base64
 from pathlib import Path
-
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING
 
 import common
 import converter
 import intermediate_format as imf
 import markdown_lib.common
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
 
-def streamline_tables(soup: BeautifulSoup):
+def streamline_tables(soup: "BeautifulSoup"):
     for table in soup.find_all("table"):
         tags_to_remove = ["div", "span"]
         for tag in tags_to_remove:
@@ -19,7 +21,7 @@ def streamline_tables(soup: BeautifulSoup):
                 element.unwrap()
 
 
-def streamline_lists(soup: BeautifulSoup):
+def streamline_lists(soup: "BeautifulSoup"):
     # - all lists are unnumbered lists (ul)
     #   - type is in the class attr (list-item-number, -bullet, -checkbox)
     # - indentation is in the class attr (indent-0)
@@ -104,6 +106,8 @@ class Converter(converter.BaseConverter):
         # HTML note seems to have the name "note.html" always
         note_body_html = (temp_folder_note / "note.html").read_text(encoding="utf-8")
 
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
         soup = BeautifulSoup(note_body_html, "html.parser")
         streamline_tables(soup)
         streamline_lists(soup)
@@ -1,8 +1,10 @@
 """Convert notion notes to the intermediate format."""
 
-import io
+import os
 from pathlib import Path
+import posixpath
 import shutil
+import tempfile
 from urllib.parse import unquote
 import zipfile
 
@@ -18,6 +20,27 @@ class Converter(converter.BaseConverter):
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.id_path_map = {".": "."}
+        # relative paths of all files, separated by "/", see convert()
+        self.files: set[str] = set()
+
+    @staticmethod
+    def extract_nested_zip(
+        zip_ref: zipfile.ZipFile, nested_zip_info: zipfile.ZipInfo, target: Path
+    ):
+        """Extract a zip inside a zip without loading it into memory."""
+        with zip_ref.open(nested_zip_info) as nested_zip:
+            if nested_zip_info.compress_type == zipfile.ZIP_STORED:
+                # Uncompressed members can be read directly, since seeking is cheap.
+                with zipfile.ZipFile(nested_zip) as nested_zip_ref:
+                    nested_zip_ref.extractall(target)
+                return
+            # Seeking backwards in a compressed member means decompressing it again.
+            # Use a temporary file instead, which is only kept in memory if small.
+            with tempfile.SpooledTemporaryFile(max_size=2**24) as nested_zip_file:
+                shutil.copyfileobj(nested_zip, nested_zip_file)
+                nested_zip_file.seek(0)
+                with zipfile.ZipFile(nested_zip_file) as nested_zip_ref:
+                    nested_zip_ref.extractall(target)
 
     def prepare_input(self, input_: Path) -> Path:
         temp_folder = common.get_temp_folder()
@@ -27,11 +50,8 @@ class Converter(converter.BaseConverter):
             is_zip = [f.endswith(".zip") for f in zip_ref.namelist()]
             if all(is_zip):
                 # usual structure: zip of zips
-                for nested_zip_name in zip_ref.namelist():
-                    with zip_ref.open(nested_zip_name) as nested_zip:
-                        nested_zip_filedata = io.BytesIO(nested_zip.read())
-                        with zipfile.ZipFile(nested_zip_filedata) as nested_zip_ref:
-                            nested_zip_ref.extractall(temp_folder)
+                for nested_zip_info in zip_ref.infolist():
+                    self.extract_nested_zip(zip_ref, nested_zip_info, temp_folder)
                 temp_folder = common.get_single_child_folder(temp_folder)
             elif not any(is_zip):
                 # unusual structure: zipped files
@@ -49,7 +69,7 @@ class Converter(converter.BaseConverter):
         return temp_folder
 
     def handle_markdown_links(
-        self, body: str, item: Path
+        self, body: str, item: Path, relative_parent_path: str
     ) -> tuple[imf.Resources, imf.NoteLinks]:
         resources = []
         note_links = []
@@ -59,9 +79,12 @@ class Converter(converter.BaseConverter):
             unquoted_url = unquote(link.url)
             if link.url.endswith(".md") or link.url.endswith(".html"):
                 # internal link
-                _, linked_note_id = Path(unquoted_url).stem.rsplit(" ", 1)
+                _, linked_note_id = common.url_stem(unquoted_url).rsplit(" ", 1)
                 note_links.append(imf.NoteLink(str(link), linked_note_id, link.text))
-            elif (item.parent / unquoted_url).is_file():
+            elif (
+                posixpath.normpath(posixpath.join(relative_parent_path, unquoted_url))
+                in self.files
+            ):
                 # resource
                 resources.append(
                     imf.Resource(item.parent / unquoted_url, str(link), link.text)
@@ -74,26 +97,29 @@ class Converter(converter.BaseConverter):
     def convert_directory(self, parent_notebook):
         relative_parent_path = self.id_path_map[parent_notebook.original_id]
 
-        for item in sorted((self.root_path / relative_parent_path).iterdir()):
+        # scandir() caches the file type, so no additional stat() calls are needed
+        for entry in common.scandir_sorted(self.root_path / relative_parent_path):
+            stem = common.url_stem(entry.name)
+            is_file = entry.is_file()
             if (
-                item.is_file()
-                and item.suffix.lower() not in (".md", ".html")
-                or item.name == "index.html"
+                is_file
+                and entry.name[len(stem) :].lower() not in (".md", ".html")
+                or entry.name == "index.html"
             ):
                 continue
             # id is appended to filename
-            title, _ = item.name.rsplit(" ", 1)
+            title, _ = entry.name.rsplit(" ", 1)
 
             # propagate the path through all parents
             # separator is always "/"
-            _, id_ = item.stem.rsplit(" ", 1)
+            _, id_ = stem.rsplit(" ", 1)
             if parent_notebook.original_id != ".":
-                self.id_path_map[id_] = relative_parent_path + "/" + item.name
+                self.id_path_map[id_] = relative_parent_path + "/" + entry.name
             else:
                 # TODO: check if "./" works on windows
-                self.id_path_map[id_] = item.name
+                self.id_path_map[id_] = entry.name
 
-            if item.is_dir():
+            if not is_file:
                 child_notebook = imf.Notebook(title, original_id=id_)
                 self.convert_directory(child_notebook)
                 # It can happen that the folder only contains resources.
@@ -103,16 +129,19 @@ class Converter(converter.BaseConverter):
                     parent_notebook.child_notebooks.append(child_notebook)
                 continue
 
+            item = Path(entry.path)
             self.logger.debug(f'Converting note "{title}"')
-            body = item.read_text(encoding="utf-8")
+            body = common.read_text_file(item)
             if item.suffix.lower() == ".md":
                 # first line is title, second is whitespace
-                body = "\n".join(item.read_text(encoding="utf-8").split("\n")[2:])
+                body = body.partition("\n")[2].partition("\n")[2]
             else:  # html
                 body = markdown_lib.common.markup_to_markdown(body)
 
             # find links
-            resources, note_links = self.handle_markdown_links(body, item)
+            resources, note_links = self.handle_markdown_links(
+                body, item, relative_parent_path
+            )
 
             note_imf = imf.Note(
                 title,
@@ -125,5 +154,12 @@ class Converter(converter.BaseConverter):
             parent_notebook.child_notes.append(note_imf)
 
     def convert(self, file_or_folder: Path):
+        # Collect the files once instead of checking each link by a stat() call.
+        self.files = set()
+        for dirpath, _, filenames in os.walk(self.root_path):
+            relative_path = Path(dirpath).relative_to(self.root_path).as_posix()
+            for filename in filenames:
+                self.files.add(posixpath.normpath(f"{relative_path}/{filename}"))
+
         self.root_notebook.original_id = "."
         self.convert_directory(self.root_notebook)
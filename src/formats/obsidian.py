@@ -1,49 +1,71 @@
 """Convert obsidian notes to the intermediate format."""
 
+from concurrent.futures import ProcessPoolExecutor
+import itertools
 from pathlib import Path
 from urllib.parse import unquote
 
-import frontmatter
-
 import common
 import converter
 import intermediate_format as imf
 import markdown_lib
 
 
+# converter of the worker processes, see convert_files_parallel()
+WORKER_CONVERTER: "Converter"
+
+
+def init_worker(converter_: "Converter"):
+    global WORKER_CONVERTER  # pylint: disable=global-statement
+    WORKER_CONVERTER = converter_
+
+
+def convert_file_in_worker(item: Path) -> list[imf.Note]:
+    """Convert a single note. The list is empty if the conversion failed."""
+    notebook = imf.Notebook("")
+    WORKER_CONVERTER.convert_file(item, notebook)
+    return notebook.child_notes
+
+
 class Converter(converter.BaseConverter):
     accept_folder = True
 
-    def handle_markdown_links(self, body: str) -> tuple[imf.Resources, imf.NoteLinks]:
+    def handle_markdown_links(
+        self, links: list[markdown_lib.common.MarkdownLink]
+    ) -> tuple[imf.Resources, imf.NoteLinks]:
         note_links = []
         resources = []
-        for link in markdown_lib.common.get_markdown_links(body):
+        for link in links:
             if link.is_web_link or link.is_mail_link:
                 continue  # keep the original links
             if link.url.endswith(".md"):
                 # internal link
-                linked_note_id = Path(unquote(link.url)).stem
+                linked_note_id = common.url_stem(unquote(link.url))
                 note_links.append(imf.NoteLink(str(link), linked_note_id, link.text))
             else:
                 # resource
-                resource_path = common.find_file_recursively(self.root_path, link.url)
+                resource_path = common.find_file_recursively(
+                    self.root_path, link.url, self.file_index
+                )
                 if resource_path is None:
                     continue
                 resources.append(imf.Resource(resource_path, str(link), link.text))
         return resources, note_links
 
-    def handle_wikilink_links(self, body: str) -> tuple[imf.Resources, imf.NoteLinks]:
+    def handle_wikilink_links(
+        self, wikilinks: list[tuple[str, str, str]]
+    ) -> tuple[imf.Resources, imf.NoteLinks]:
         # https://help.obsidian.md/Linking+notes+and+files/Internal+links
         note_links = []
         resources = []
-        for file_prefix, url, description in markdown_lib.common.get_wikilink_links(
-            body
-        ):
+        for file_prefix, url, description in wikilinks:
             alias = "" if description.strip() == "" else f"|{description}"
             original_text = f"{file_prefix}[[{url}{alias}]]"
             if file_prefix:
                 # resource
-                resource_path = common.find_file_recursively(self.root_path, url)
+                resource_path = common.find_file_recursively(
+                    self.root_path, url, self.file_index
+                )
                 if resource_path is None:
                     continue
                 resources.append(
@@ -54,33 +76,37 @@ class Converter(converter.BaseConverter):
                 note_links.append(imf.NoteLink(original_text, url, description or url))
         return resources, note_links
 
-    def handle_links(self, body: str) -> tuple[imf.Resources, imf.NoteLinks]:
+    def handle_links(
+        self, scan: markdown_lib.common.NoteScan
+    ) -> tuple[imf.Resources, imf.NoteLinks]:
         # Resources can be anywhere:
         # https://help.obsidian.md/Editing+and+formatting/Attachments#Change+default+attachment+location
-        wikilink_resources, wikilink_note_links = self.handle_wikilink_links(body)
-        markdown_resources, markdown_note_links = self.handle_markdown_links(body)
-        return (
-            wikilink_resources + markdown_resources,
-            wikilink_note_links + markdown_note_links,
+        resources, note_links = self.handle_wikilink_links(scan.wikilinks)
+        markdown_resources, markdown_note_links = self.handle_markdown_links(
+            scan.markdown_links
         )
+        # extend in place, no need for a new list
+        resources.extend(markdown_resources)
+        note_links.extend(markdown_note_links)
+        return resources, note_links
 
     @common.catch_all_exceptions
     def convert_file(self, item: Path, parent: imf.Notebook):
-        if item.suffix.lower() != ".md":
-            return
         title = item.stem
         self.logger.debug(f'Converting note "{title}"')
 
-        body = item.read_text(encoding="utf-8")
-        resources, note_links = self.handle_links(body)
-
-        # https://help.obsidian.md/Editing+and+formatting/Tags
-        inline_tags = markdown_lib.common.get_inline_tags(body, ["#"])
+        body = common.read_text_file(item)
 
         # frontmatter tags
         # https://help.obsidian.md/Editing+and+formatting/Properties#Default+properties
-        metadata, body = frontmatter.parse(body)
-        frontmatter_tags = metadata.get("tags", [])
+        frontmatter_, body = markdown_lib.common.split_frontmatter(body)
+        frontmatter_tags = markdown_lib.common.extract_frontmatter_tags(frontmatter_)
+
+        # Scan the note only once for links and tags.
+        # https://help.obsidian.md/Editing+and+formatting/Tags
+        scan = markdown_lib.common.scan_note(body)
+        resources, note_links = self.handle_links(scan)
+        inline_tags = scan.inline_tags
 
         # aliases seem to be only used in the link description
         # frontmatter_.get("aliases", [])
@@ -90,22 +116,62 @@ class Converter(converter.BaseConverter):
                 title,
                 body,
                 source_application=self.format,
-                tags=[imf.Tag(tag) for tag in inline_tags + frontmatter_tags],
+                # a tag can be inline and in the frontmatter
+                tags=[
+                    imf.Tag(tag)
+                    for tag in dict.fromkeys(
+                        itertools.chain(inline_tags, frontmatter_tags)
+                    )
+                ],
                 resources=resources,
                 note_links=note_links,
             )
         )
 
+    def convert_files_parallel(self, files: list[tuple[Path, imf.Notebook]]):
+        """
+        Convert the notes in multiple processes. The notes are independent
+        of each other, so only the results need to be attached to the parents.
+        """
+        with ProcessPoolExecutor(
+            max_workers=self._config.jobs, initializer=init_worker, initargs=(self,)
+        ) as executor:
+            notes_per_file = executor.map(
+                convert_file_in_worker,
+                [item for item, _ in files],
+                chunksize=max(1, len(files) // (self._config.jobs * 4)),
+            )
+            for (_, parent), notes in zip(files, notes_per_file):
+                parent.child_notes.extend(notes)
+
     def convert_folder(self, folder: Path, parent: imf.Notebook):
-        for item in sorted(folder.iterdir()):
-            if item.is_dir() and item.name == ".obsidian":
-                continue  # ignore the internal obsidian folder
-            if item.is_file():
-                self.convert_file(item, parent)
-            else:
-                new_parent = imf.Notebook(item.name)
-                self.convert_folder(item, new_parent)
-                parent.child_notebooks.append(new_parent)
+        # Walk the folders iteratively. The notebooks are linked to their parent
+        # immediately, so the order of processing doesn't matter.
+        # The files are collected first, if they are converted in parallel.
+        files = []
+        stack = [(folder, parent)]
+        while stack:
+            current_folder, current_parent = stack.pop()
+            subfolders = []
+            for entry in common.scandir_sorted(current_folder):
+                if entry.is_file():
+                    # Check the suffix here to avoid creating a path for all files.
+                    if not entry.name.lower().endswith(".md"):
+                        continue
+                    if self._config.jobs > 1:
+                        files.append((Path(entry.path), current_parent))
+                    else:
+                        self.convert_file(Path(entry.path), current_parent)
+                elif entry.name != ".obsidian":  # ignore the internal obsidian folder
+                    new_parent = imf.Notebook(entry.name)
+                    current_parent.child_notebooks.append(new_parent)
+                    subfolders.append((Path(entry.path), new_parent))
+            # reversed, to process the first subfolder next
+            stack.extend(reversed(subfolders))
+        if files:
+            self.convert_files_parallel(files)
 
     def convert(self, file_or_folder: Path):
+        # Resources can be anywhere in the vault. Index them once.
+        self.file_index = common.index_files_recursively(self.root_path)
         self.convert_folder(file_or_folder, self.root_notebook)
@@ -43,7 +43,9 @@ class Converter(converter.BaseConverter):
             if link.url.endswith(".md"):
                 # internal link
                 note_links.append(
-                    imf.NoteLink(str(link), Path(unquote(link.url)).stem, link.text)
+                    imf.NoteLink(
+                        str(link), common.url_stem(unquote(link.url)), link.text
+                    )
                 )
             else:
                 # resource
@@ -1,10 +1,9 @@
 """Convert RedNotebook notes to the intermediate format."""
 
+import dataclasses
 from pathlib import Path
 from urllib.parse import urlparse
 
-import yaml
-
 import converter
 import intermediate_format as imf
 import markdown_lib
@@ -20,16 +19,18 @@ class Converter(converter.BaseConverter):
             # Links are usually enclosed with double quotation marks.
             # They get removed in some cases when parsing. Add them again
             # to get the original string.
-            if not link.url.startswith('""'):
-                link.url = f'""{link.url}""'
-            original_link_text = str(link)
+            url = link.url
+            if not url.startswith('""'):
+                url = f'""{url}""'
+            original_link_text = str(dataclasses.replace(link, url=url))
 
             # remove double quotation marks
-            link.url = link.url.replace('""', "")
+            url = url.replace('""', "")
             # remove the "file://" protocol if needed
-            parsed_link = urlparse(link.url)
+            parsed_link = urlparse(url)
             if parsed_link.scheme == "file":
-                link.url = parsed_link.path
+                url = parsed_link.path
+            link = dataclasses.replace(link, url=url)
 
             if link.is_web_link or link.is_mail_link:
                 # Resource links get replaced later,
@@ -45,6 +46,8 @@ class Converter(converter.BaseConverter):
         return body, resources
 
     def convert(self, file_or_folder: Path):
+        import yaml  # pylint: disable=import-outside-toplevel
+
         for file_ in sorted(self.root_path.glob("*.txt")):
             # TODO: Split year into separate notebook?
             parent_notebook = imf.Notebook(file_.stem)
@@ -1,19 +1,33 @@
 """Convert Synology Note Station notes to the intermediate format."""
 
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass, field
-import difflib
-import json
+import logging
 from pathlib import Path
 import re
 
-from bs4 import BeautifulSoup
-
 import common
 import converter
 import intermediate_format as imf
 import markdown_lib
 
 
+LOGGER = logging.getLogger("jimmy")
+
+# The patterns are used for every note, so compile them only once.
+# re.UNICODE is the default for str patterns.
+IMG_REF_REGEX = re.compile("<img.*?ref=", re.DOTALL)
+# Parts of the HTML aren't normalized by BeautifulSoup, see streamline_html().
+EMPTY_DIV_REGEX = re.compile(r"<div\s*(?:/>|></div\s*>)", re.IGNORECASE)
+MULTIPLE_NEWLINES_REGEX = re.compile(r"\n+")
+NEXT_LINE_REGEX = re.compile(r"\n(.*)")
+FIRST_LINE_REGEX = re.compile(r"(.*)\n")
+TIME_LINE_REGEX = re.compile(r"(\*\*[0-9]+:[0-9]+\s+[A|P]M\*\*)\n")
+BOLD_OR_HEADER_REGEX = re.compile(r"(\*\*)|(#+\s)")
+WEEK_REGEX = re.compile(r"(First|Second|Third|Fourth|Fifth)\s*([W|w]eek)")
+FIRST_WEEK_REGEX = re.compile(r"First (W|w)eek")
+
+
 @dataclass
 class Attachment:
     """Represents a Note Station attachment."""
@@ -24,12 +38,49 @@ class Attachment:
     titles: list[str] = field(default_factory=list)
 
 
-def streamline_html(content_html: str) -> str:
-    # hack: In the original data, the attachment_id is stored in the
-    # "ref" attribute. Mitigate by storing it in the "src" attribute.
-    content_html = re.sub("<img.*?ref=", "<img src=", content_html,flags=re.DOTALL)
+# Note titles are compared only up to this length.
+MAX_TITLE_LENGTH = 50
+
+
+TABLE_TAG_REGEX = re.compile(r"<(/?)table\b[^>]*>", re.IGNORECASE)
+# Table tags can't be found by a regex if they are inside of these elements.
+UNSCANNABLE_HTML_REGEX = re.compile(
+    r"<(?:!--|!\[CDATA\[|script\b|style\b)", re.IGNORECASE
+)
+
+
+def find_table_spans(content_html: str) -> list[tuple[int, int]] | None:
+    """
+    Find the outermost tables of a HTML document.
+    Return None if the table tags aren't balanced.
+
+    >>> find_table_spans("a<table><tr><td><table></table></td></tr></table>b")
+    [(1, 49)]
+    >>> find_table_spans("<TABLE class='x'></TABLE><table></table>")
+    [(0, 25), (25, 40)]
+    >>> find_table_spans("<table>") is None
+    True
+    """
+    spans = []
+    depth = 0
+    start = 0
+    for match in TABLE_TAG_REGEX.finditer(content_html):
+        if match[1]:  # closing tag
+            depth -= 1
+            if depth < 0:
+                return None
+            if depth == 0:
+                spans.append((start, match.end()))
+        else:
+            if depth == 0:
+                start = match.start()
+            depth += 1
+    return spans if depth == 0 else None
+
+
+def streamline_tables(content_html: str) -> str:
+    from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
 
-    # another hack: make the first row of a table to the header
     soup = BeautifulSoup(content_html, "html.parser")
     for table in soup.find_all("table"):
         # Remove all divs, since they cause pandoc to fail converting the table.
@@ -51,17 +102,152 @@ def streamline_html(content_html: str) -> str:
     return str(soup)
 
 
+def streamline_html(content_html: str) -> str:
+    # hack: In the original data, the attachment_id is stored in the
+    # "ref" attribute. Mitigate by storing it in the "src" attribute.
+    if "ref=" in content_html:
+        content_html = IMG_REF_REGEX.sub("<img src=", content_html)
+
+    # another hack: make the first row of a table to the header
+    # Parsing the complete document is expensive. Only parse the tables if possible.
+    if (
+        UNSCANNABLE_HTML_REGEX.search(content_html) is not None
+        or (table_spans := find_table_spans(content_html)) is None
+    ):
+        return streamline_tables(content_html)
+    if not table_spans:
+        return content_html  # no tables, nothing to do
+    parts = []
+    last_end = 0
+    for start, end in table_spans:
+        parts.append(content_html[last_end:start])
+        parts.append(streamline_tables(content_html[start:end]))
+        last_end = end
+    parts.append(content_html[last_end:])
+    return "".join(parts)
+
+
+def cleanup_markdown(note_content: str) -> str:
+    """
+    Remove all blank lines and convert "&gt;" and "&lt;" to > and <.
+    With OneNote converted notes in Synology Notes, legitimate blank lines
+    from the original note content contain a space.
+
+    >>> cleanup_markdown("a &lt;b&gt;\\n\\n\\nc")
+    'a <b>\\nc'
+    """
+    despaced_content = MULTIPLE_NEWLINES_REGEX.sub("\n", note_content)
+    if "&" not in despaced_content:
+        return despaced_content  # a single pass for the usual case
+    # Don't use html.unescape(). Other entities, like "&amp;", have to be kept.
+    return despaced_content.replace("&gt;", ">").replace("&lt;", "<")
+
+
+def postprocess_onenote_notes(note_content: str) -> str:
+    # first line is the title, so use h1
+    processed_content = f'# {note_content}'
+    # make the next two lines bold (date and time)
+    processed_content = NEXT_LINE_REGEX.sub(r"\n**\1**", processed_content, 2)
+    # add a blank line after the title, date, and time header
+    processed_content = TIME_LINE_REGEX.sub(r"\1\n\n", processed_content, 1)
+    return processed_content
+
+
+def clean_task_note(note_content: str) -> str:
+    # fix formatting of some recent task notes due to dark mode reader browser plugin
+    # remove all bold and existing headers (#)
+    debold_content = BOLD_OR_HEADER_REGEX.sub(r"", note_content)
+    # ensure header is h1
+    hdr_content = FIRST_LINE_REGEX.sub(r"# \1\n", debold_content, 1)
+    # ensure week lines are headers
+    hdr_content = WEEK_REGEX.sub(r"# \1 \2", hdr_content)
+    return hdr_content
+
+
+def convert_content(title: str, content_html: str) -> tuple[str, bool]:
+    """
+    Convert the HTML content of a note to Markdown. Return the Markdown and
+    whether it is a OneNote note. This is independent of the other notes.
+    """
+    onenote = False
+    content_html = streamline_html(content_html)
+    # replace empty divs with a space for easier postprocessing and to retain original
+    # Synology Notes format line spacing.
+    content_html = EMPTY_DIV_REGEX.sub("<div>&nbsp;</div>", content_html)
+    content_markdown = markdown_lib.common.markup_to_markdown(content_html)
+    content_md_cleaned = cleanup_markdown(content_markdown)
+    if "Created with OneNote" in content_markdown:
+        onenote = True
+        #LOGGER.debug(f"Handling OneNote note: {title}")
+        content_md_cleaned = postprocess_onenote_notes(content_md_cleaned)
+    elif FIRST_WEEK_REGEX.search(content_md_cleaned):
+        LOGGER.debug(f"Cleaning task note: {title}")
+        content_md_cleaned = clean_task_note(content_md_cleaned)
+    return content_md_cleaned, onenote
+
+
+def convert_note_content(note: dict) -> tuple[str, bool] | None:
+    """
+    Convert the content of a note in a worker process.
+    Return None if the note is skipped or the conversion failed. Failed notes
+    are converted again in the main process to get the usual error handling.
+    """
+    try:
+        if note["parent_id"].rsplit("_")[-1] == "#00000000":
+            return None
+        if (content_html := note.get("content")) is None:
+            return None
+        return convert_content(note["title"], content_html)
+    except Exception:  # pylint: disable=broad-except
+        return None
+
+
+def find_most_similar_title(text: str, note_id_title_map: dict[str, str]) -> str:
+    """
+    Find the ID of the note whose title is the most similar to the text.
+    The result is the same as comparing all titles by SequenceMatcher.ratio(),
+    but the cheap upper bounds of the ratio skip most of the expensive comparisons.
+
+    >>> find_most_similar_title("Shopping", {"1": "Todo", "2": "Shopping list"})
+    '2'
+    >>> find_most_similar_title("a", {"1": "b", "2": "c"})
+    '1'
+    """
+    import difflib  # pylint: disable=import-outside-toplevel
+
+    matcher = difflib.SequenceMatcher(None, text)
+    best_id = next(iter(note_id_title_map))
+    best_ratio = -1.0
+    for id_, title in note_id_title_map.items():
+        matcher.set_seq2(title)
+        if (
+            matcher.real_quick_ratio() <= best_ratio
+            or matcher.quick_ratio() <= best_ratio
+        ):
+            continue  # can't be better than the best match
+        if (ratio := matcher.ratio()) > best_ratio:
+            best_id = id_
+            best_ratio = ratio
+    return best_id
+
+
 class Converter(converter.BaseConverter):
     accepted_extensions = [".nsx"]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.available_resources = []
+        self.resources_by_md5: dict[str, Attachment] = {}
+        self.resources_by_ref: dict[str, list[Attachment]] = {}
+        # link text -> note ID, see find_most_similar_title()
+        self.title_match_cache: dict[str, str] = {}
+        self.notebook_id_map: dict[str, imf.Notebook] = {}
+        # notebook ID -> truncated titles of its notes, see deduplicate_note_title()
+        self.note_titles: dict[str | None, set[str]] = {}
 
     def find_parent_notebook(self, parent_id: str) -> imf.Notebook:
-        for notebook in self.root_notebook.child_notebooks:
-            if notebook.original_id == parent_id:
-                return notebook
+        if (notebook := self.notebook_id_map.get(parent_id)) is not None:
+            return notebook
         self.logger.debug(f"Couldn't find parent notebook with id {parent_id}")
         return self.root_notebook
 
@@ -83,19 +269,16 @@ class Converter(converter.BaseConverter):
                 # _, linked_note_id = link.url.rsplit("/", 1)
 
                 # try to map by title similarity
-                def get_match_ratio(id_, link_text=link.text):
-                    return difflib.SequenceMatcher(
-                        None, link_text, note_id_title_map[id_]
-                    ).ratio()
-
-                best_match_id = max(note_id_title_map, key=get_match_ratio)
+                if (best_match_id := self.title_match_cache.get(link.text)) is None:
+                    best_match_id = find_most_similar_title(
+                        link.text, note_id_title_map
+                    )
+                    self.title_match_cache[link.text] = best_match_id
                 note_links.append(imf.NoteLink(str(link), best_match_id, link.text))
             else:
                 # resource
                 # Find resource file by "ref".
-                matched_resources = [
-                    res for res in self.available_resources if link.url in res.refs
-                ]
+                matched_resources = self.resources_by_ref.get(link.url, [])
                 if len(matched_resources) != 1:
                     self.logger.debug(
                         "Found too less or too many resources: "
@@ -113,56 +296,48 @@ class Converter(converter.BaseConverter):
         return resources, note_links
 
     def convert_notebooks(self, input_json: dict):
+        self.notebook_id_map = {}
         for notebook_id in input_json["notebook"]:
-            notebook = json.loads(
-                (self.root_path / notebook_id).read_text(encoding="utf-8")
-            )
+            notebook = common.read_json_file(self.root_path / notebook_id)
 
-            self.root_notebook.child_notebooks.append(
-                imf.Notebook(notebook["title"], original_id=notebook_id)
-            )
+            notebook_imf = imf.Notebook(notebook["title"], original_id=notebook_id)
+            self.root_notebook.child_notebooks.append(notebook_imf)
+            # the first notebook wins, like in a linear search
+            self.notebook_id_map.setdefault(notebook_id, notebook_imf)
 
     def map_resources_by_hash(self, note: dict) -> imf.Resources:
         resources: imf.Resources = []
         if note.get("attachment") is None:
             return resources
         for note_resource in note["attachment"].values():
-            # TODO: access directly by filename (e. g. "file_<md5>")
-            for file_resource in self.available_resources:
-                if note_resource["md5"] == file_resource.md5:
-                    if (ref := note_resource.get("ref")) is not None:
-                        # The same resource can be linked multiple times.
-                        file_resource.refs.append(ref)
-                        file_resource.titles.append(note_resource["name"])
-                    else:
-                        # The attachment is not referenced. Add it here.
-                        # Referenced attachments are added later.
-                        resources.append(
-                            imf.Resource(
-                                file_resource.filename, title=note_resource["name"]
-                            )
-                        )
-                    break
+            file_resource = self.resources_by_md5.get(note_resource["md5"])
+            if file_resource is None:
+                continue
+            if (ref := note_resource.get("ref")) is not None:
+                # The same resource can be linked multiple times.
+                file_resource.refs.append(ref)
+                file_resource.titles.append(note_resource["name"])
+                ref_resources = self.resources_by_ref.setdefault(ref, [])
+                if file_resource not in ref_resources:
+                    ref_resources.append(file_resource)
+            else:
+                # The attachment is not referenced. Add it here.
+                # Referenced attachments are added later.
+                resources.append(
+                    imf.Resource(file_resource.filename, title=note_resource["name"])
+                )
         return resources
 
-    def postprocess_onenote_notes(self, note_content: str) -> str:
-        # remove all blank lines.  With OneNote converted notes in Synology Notes,
-        # legitimate blank lines from the original note content contain a space.
-        despaced_content = re.compile(r"\n+", re.UNICODE).sub('\n', note_content)
-        # first line is the title, so use h1
-        processed_content = f'# {despaced_content}'
-        # make the next two lines bold (date and time)
-        processed_content = re.sub(r"\n(.*)",r"\n**\1**", processed_content, 2, re.UNICODE)
-        # add a blank line after the title, date, and time header
-        processed_content = re.sub(r"(\*\*[0-9]+:[0-9]+\s+[A|P]M\*\*)\n", r"\1\n\n", processed_content, 1, re.UNICODE)
-        # convert "&gt;" and "&lt;" to > and <
-        processed_content = re.sub(r"&gt;", r">", processed_content, flags=re.UNICODE)
-        processed_content = re.sub(r"&lt;", r"<", processed_content,re.UNICODE)
-        return processed_content
-
-    def deduplicate_note_title(self, parent_notebook: imf.Notebook , note_imf: imf.Note, includes_date: bool = False, max_name_length: int = 50):
+    def deduplicate_note_title(
+        self,
+        parent_notebook: imf.Notebook,
+        note_imf: imf.Note,
+        includes_date: bool = False,
+        max_name_length: int = MAX_TITLE_LENGTH,
+    ):
         # ensure note title is unique
-        if note_imf.title[:max_name_length] in [note.title[:max_name_length] for note in parent_notebook.child_notes]:
+        existing_titles = self.note_titles.get(parent_notebook.original_id, set())
+        if note_imf.title[:max_name_length] in existing_titles:
             # title already exists, so need to de-dupe
             if includes_date:
                 self.logger.warning(f'Note already exists, so adding created timestamp (H-M): {note_imf.title}')
@@ -178,20 +353,14 @@ class Converter(converter.BaseConverter):
         else:
             return
 
-    def clean_task_note(self, note_content: str) -> str:
-       # fix formatting of some recent task notes due to dark mode reader browser plugin
-       # remove all bold and existing headers (#)
-       debold_content = re.sub(r"(\*\*)|(#+\s)", r"", note_content, re.UNICODE)
-       # ensure header is h1
-       hdr_content = re.sub(r"(.*)\n", r"# \1\n", debold_content, 1, re.UNICODE)
-       # ensure week lines are headers
-       hdr_content = re.sub(r"(First|Second|Third|Fourth|Fifth)\s*([W|w]eek)", r"# \1 \2", hdr_content, re.UNICODE)
-       return hdr_content
-
     @common.catch_all_exceptions
-    def convert_note(self, note_id, note_id_title_map):
-        note = json.loads((self.root_path / note_id).read_text(encoding="utf-8"))
-
+    def convert_note(
+        self,
+        note_id,
+        note,
+        note_id_title_map,
+        converted_content: tuple[str, bool] | None = None,
+    ):
         if note["parent_id"].rsplit("_")[-1] == "#00000000":
             self.logger.debug(f"Ignoring note in trash \"{note['title']}\"")
             return
@@ -204,25 +373,9 @@ class Converter(converter.BaseConverter):
         note_links: imf.NoteLinks = []
         onenote = False
         if (content_html := note.get("content")) is not None:
-            content_html = streamline_html(content_html)
-            # replace empty divs with a space for easier postprocessing and to retain original
-            # Synology Notes format line spacing.
-            content_html = re.sub(r"<div></div>", "<div>&nbsp;</div>", content_html, re.UNICODE)
-            content_markdown = markdown_lib.common.markup_to_markdown(content_html)
-            content_md_cleaned = ""
-            if re.search(r"Created with OneNote", content_markdown):
-                onenote = True
-                #self.logger.debug(f"Handling OneNote note: {title}")
-                content_md_cleaned = self.postprocess_onenote_notes(content_markdown)
-            else:
-                content_md_cleaned = re.compile(r"\n+", re.UNICODE).sub('\n', content_markdown)
-                # convert "&gt;" and "&lt;" to > and <
-                content_md_cleaned = re.sub(r"&gt;", r">", content_md_cleaned, flags=re.UNICODE)
-                content_md_cleaned = re.sub(r"&lt;", r"<", content_md_cleaned,re.UNICODE)
-                if re.search(r"First (W|w)eek", content_md_cleaned):
-                    self.logger.debug(f"Cleaning task note: {title}")
-                    content_md_cleaned = self.clean_task_note(content_md_cleaned)
-                #content_md_cleaned = content_markdown
+            if converted_content is None:
+                converted_content = convert_content(title, content_html)
+            content_md_cleaned, onenote = converted_content
              # note title only needed for debug message
             resources_referenced, note_links = self.handle_markdown_links(
                 note["title"], content_md_cleaned, note_id_title_map
@@ -258,12 +411,13 @@ class Converter(converter.BaseConverter):
 #            note_imf.title += " " + note_imf.created.strftime("%m-%d-%Y")
         self.deduplicate_note_title(parent_notebook, note_imf)
         parent_notebook.child_notes.append(note_imf)
+        self.note_titles.setdefault(parent_notebook.original_id, set()).add(
+            note_imf.title[:MAX_TITLE_LENGTH]
+        )
 
     def convert(self, file_or_folder: Path):
         # pylint: disable=too-many-locals
-        input_json = json.loads(
-            (self.root_path / "config.json").read_text(encoding="utf-8")
-        )
+        input_json = common.read_json_file(self.root_path / "config.json")
 
         # TODO: What is input_json["shortcut"]?
         # TODO: Are nested notebooks possible?
@@ -278,15 +432,38 @@ class Converter(converter.BaseConverter):
                     continue  # ignore thumbnails
                 # Don't use the actual hash: hashlib.md5(item.read_bytes()).hexdigest()
                 # It can change. So we need to take the hash from the filename.
-                self.available_resources.append(
-                    Attachment(item, item.stem.split("_")[-1])
+                attachment = Attachment(item, item.stem.split("_")[-1])
+                self.available_resources.append(attachment)
+                # The first attachment wins, like in a linear search.
+                self.resources_by_md5.setdefault(attachment.md5, attachment)
+
+        # Read each note only once. For internal links,
+        # we need to know all note titles before converting the notes.
+        notes = {
+            note_id: common.read_json_file(self.root_path / note_id)
+            for note_id in input_json["note"]
+        }
+        note_id_title_map = {note_id: note["title"] for note_id, note in notes.items()}
+        self.title_match_cache = {}
+        self.note_titles = {}
+
+        # The content conversion is expensive and independent of the other notes.
+        # Everything else depends on the order of the notes.
+        converted_contents: list[tuple[str, bool] | None] = []
+        if self._config.jobs > 1:
+            with ProcessPoolExecutor(max_workers=self._config.jobs) as executor:
+                converted_contents = list(
+                    executor.map(
+                        convert_note_content,
+                        notes.values(),
+                        chunksize=max(1, len(notes) // (self._config.jobs * 4)),
+                    )
                 )
 
-        # for internal links, we need to store the note titles
-        note_id_title_map = {}
-        for note_id in input_json["note"]:
-            note = json.loads((self.root_path / note_id).read_text(encoding="utf-8"))
-            note_id_title_map[note_id] = note["title"]
-
-        for note_id in input_json["note"]:
-            self.convert_note(note_id, note_id_title_map)
+        for index, (note_id, note) in enumerate(notes.items()):
+            self.convert_note(
+                note_id,
+                note,
+                note_id_title_map,
+                converted_contents[index] if converted_contents else None,
+            )
@@ -1,10 +1,9 @@
 """Convert TiddlyWiki notes to the intermediate format."""
 
-import base64
+import binascii
 import datetime as dt
 from html.parser import HTMLParser
 import logging
-import json
 from pathlib import Path
 
 import common
@@ -22,6 +21,8 @@ class MarkdownHtmlSeparator(HTMLParser):
         self.active_html_tags = []
         self.md = []
         self.html = []
+        # HTML parts and their index in self.md, converted at once in get_md()
+        self.html_parts: list[tuple[int, str]] = []
 
     def handle_starttag(self, tag, attrs):
         # ignore void elements: https://developer.mozilla.org/en-US/docs/Glossary/Void_element
@@ -72,8 +73,9 @@ class MarkdownHtmlSeparator(HTMLParser):
 
     def handle_remaining_html(self):
         if self.html:
-            # TODO: minimize calls, as pandoc is slow
-            self.md.append(markdown_lib.common.markup_to_markdown("".join(self.html)))
+            # Insert a placeholder. Pandoc is slow, so convert all parts at once.
+            self.html_parts.append((len(self.md), "".join(self.html)))
+            self.md.append("")
             self.html = []
 
     def get_md(self) -> str:
@@ -81,6 +83,11 @@ class MarkdownHtmlSeparator(HTMLParser):
             LOGGER.warning(f'Unexpected open tags: {" ".join(self.active_html_tags)}')
             raise ValueError()
         self.handle_remaining_html()
+        parts_md = markdown_lib.common.markup_to_markdown_batch(
+            [html for _, html in self.html_parts]
+        )
+        for (index, _), part_md in zip(self.html_parts, parts_md):
+            self.md[index] = part_md
         return "".join(self.md)
 
 
@@ -115,24 +122,28 @@ def split_tags(tag_string: str) -> list[str]:
     ['tag1', 'tag2', 'tag3']
     >>> split_tags("")
     []
+    >>> split_tags("[[tag]]  tag2 [[unclosed tag")
+    ['tag', 'tag2', '[[unclosed', 'tag']
     """
-    if not tag_string.strip():
-        return []
-    space_splitted = tag_string.split(" ")
+    # Find the start and end of each tag and slice it from the string.
     final_tags = []
-    space_separated_tag = ""
-    for part in space_splitted:
-        if space_separated_tag:
-            if part.endswith("]]"):
-                space_separated_tag += " " + part[:-2]
-                final_tags.append(space_separated_tag)
-                space_separated_tag = ""
-            else:
-                space_separated_tag += " " + part
-        elif part.startswith("[["):
-            space_separated_tag = part[2:]
-        else:
-            final_tags.append(part)
+    index = 0
+    length = len(tag_string)
+    while index < length:
+        if tag_string[index] == " ":
+            index += 1
+            continue
+        if tag_string.startswith("[[", index):
+            end = tag_string.find("]]", index + 2)
+            if end != -1:
+                final_tags.append(tag_string[index + 2 : end])
+                index = end + 2
+                continue
+        end = tag_string.find(" ", index)
+        if end == -1:
+            end = length
+        final_tags.append(tag_string[index:end])
+        index = end
     return final_tags
 
 
@@ -146,9 +157,13 @@ class Converter(converter.BaseConverter):
         self.resource_folder = common.get_temp_folder()
 
     def convert_json(self, file_or_folder: Path):
-        file_dict = json.loads(file_or_folder.read_text(encoding="utf-8"))
+        file_dict = common.read_json_file(file_or_folder)
         for tiddler in file_dict:
             title = tiddler["title"]
+            # Tags don't have a separate id. Just use the name as id.
+            tags = split_tags(tiddler.get("tags", ""))
+            if any(tag.startswith("$:/tags/") for tag in tags):
+                continue  # skip notes with special tags before converting them
             self.logger.debug(f'Converting note "{title}"')
 
             resources = []
@@ -169,7 +184,9 @@ class Converter(converter.BaseConverter):
                         if resource_title is None
                         else resource_title
                     )
-                    temp_filename.write_bytes(base64.b64decode(text_base64))
+                    # Decode the string directly. base64.b64decode() would copy it
+                    # to bytes first, which is expensive for big attachments.
+                    temp_filename.write_bytes(binascii.a2b_base64(text_base64))
                     body = f"![{temp_filename.name}]({temp_filename})"
                     resources.append(imf.Resource(temp_filename, body, resource_title))
                 elif (source := tiddler.get("source")) is not None:
@@ -189,25 +206,21 @@ class Converter(converter.BaseConverter):
                 body,
                 author=tiddler.get("creator"),
                 source_application=self.format,
-                # Tags don't have a separate id. Just use the name as id.
-                tags=[imf.Tag(tag) for tag in split_tags(tiddler.get("tags", ""))],
+                tags=[imf.Tag(tag) for tag in tags],
                 resources=resources,
             )
             if "created" in tiddler:
                 note_imf.created = tiddlywiki_to_datetime(tiddler["created"])
             if "modified" in tiddler:
                 note_imf.updated = tiddlywiki_to_datetime(tiddler["modified"])
-            if any(t.reference_id.startswith("$:/tags/") for t in note_imf.tags):
-                continue  # skip notes with special tags
             self.root_notebook.child_notes.append(note_imf)
 
     @common.catch_all_exceptions
     def convert_tid(self, file_or_folder: Path):
         # pylint: disable=too-many-locals
-        tiddler = file_or_folder.read_text(encoding="utf-8")
-        try:
-            metadata_raw, body_wikitext = tiddler.split("\n\n", maxsplit=1)
-        except ValueError:
+        tiddler = common.read_text_file(file_or_folder)
+        metadata_raw, separator, body_wikitext = tiddler.partition("\n\n")
+        if not separator:
             metadata_raw = ""
             body_wikitext = tiddler
 
@@ -57,7 +57,7 @@ class Converter(converter.BaseConverter):
                     # TODO: this could be a resource, too. How to distinguish?
                     # internal link
                     note_links.append(
-                        imf.NoteLink(str(link), Path(link.url).stem, link.text)
+                        imf.NoteLink(str(link), common.url_stem(link.url), link.text)
                     )
         return resources, note_links
 
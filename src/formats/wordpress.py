@@ -16,6 +16,20 @@ def get_text(element, default: str | None = None) -> str | None:
     return default
 
 
+def get_comments(comments, namespaces) -> list[tuple[str, str]]:
+    """Get the author and the HTML content of the comments."""
+    comments_html = []
+    for comment in comments:
+        comment_content = get_text(comment.find("wp:comment_content", namespaces))
+        if comment_content is not None:
+            comment_author = get_text(
+                comment.find("wp:comment_author", namespaces), default="Unknown"
+            )
+            assert comment_author is not None
+            comments_html.append((comment_author, comment_content))
+    return comments_html
+
+
 class Converter(converter.BaseConverter):
     accepted_extensions = [".xml"]
 
@@ -49,27 +63,23 @@ class Converter(converter.BaseConverter):
         except (TypeError, ValueError):
             self.logger.debug("Failed to parse date.")
 
+        # Collect the content and the comments. Pandoc is slow,
+        # so convert them at once.
         content = get_text(item.find("content:encoded", namespaces))
+        comments = item.findall("wp:comment", namespaces)
+        comments_html = get_comments(comments, namespaces)
+        texts_md = markdown_lib.common.markup_to_markdown_batch(
+            ([] if content is None else [content])
+            + [comment_content for _, comment_content in comments_html]
+        )
+
         if content is not None:
-            note_imf.body = markdown_lib.common.markup_to_markdown(content)
+            note_imf.body = texts_md.pop(0)
 
-        if comments := item.findall("wp:comment", namespaces):
+        if comments:
             comments_md = ["", "", "## Comments"]
-            for comment in comments:
-                comment_author = get_text(
-                    comment.find("wp:comment_author", namespaces),
-                    default="Unknown",
-                )
-                comment_content = get_text(
-                    comment.find("wp:comment_content", namespaces)
-                )
-                if comment_content is not None:
-                    comment_content_md = markdown_lib.common.markup_to_markdown(
-                        comment_content
-                    )
-                    comments_md.extend(
-                        ["", f"**{comment_author}**: {comment_content_md}"]
-                    )
+            for (comment_author, _), comment_content_md in zip(comments_html, texts_md):
+                comments_md.extend(["", f"**{comment_author}**: {comment_content_md}"])
             note_imf.body += "\n".join(comments_md)
 
         parent_notebook.child_notes.append(note_imf)
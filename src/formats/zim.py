@@ -18,12 +18,13 @@ class Converter(converter.BaseConverter):
     accept_folder = True
 
     @staticmethod
-    def resolve_resource(resource_path: Path, url: Path) -> Path:
+    def resolve_resource(resource_path: Path, url: str) -> Path:
         # relative resources are stored in a folder named like the note
         # example:
         # - note.md
         # - note/image.png
-        return url if Path(url).is_absolute() else resource_path / url
+        url_path = Path(url)
+        return url_path if url_path.is_absolute() else resource_path / url_path
 
     def handle_zim_links(
         self, body: str, resource_path: Path
@@ -3,16 +3,18 @@
 import datetime as dt
 import json
 from pathlib import Path
-
-from bs4 import BeautifulSoup
+from typing import TYPE_CHECKING
 
 import common
 import converter
 import intermediate_format as imf
 import markdown_lib
 
+if TYPE_CHECKING:
+    from bs4 import BeautifulSoup
+
 
-def streamline_tables(soup: BeautifulSoup):
+def streamline_tables(soup: "BeautifulSoup"):
     for table in soup.find_all("table"):
         for row in table.find_all("tr"):
             for td in row.find_all("td"):
@@ -22,7 +24,7 @@ def streamline_tables(soup: BeautifulSoup):
                 td.append(text_only)
 
 
-def streamline_checklists(soup: BeautifulSoup):
+def streamline_checklists(soup: "BeautifulSoup"):
     for task_list in soup.find_all("div", class_="checklist"):
         task_list.name = "ul"
         # remove the spans
@@ -72,6 +74,8 @@ class Converter(converter.BaseConverter):
 
     @common.catch_all_exceptions
     def convert_note(self, file_: Path):
+        from bs4 import BeautifulSoup  # pylint: disable=import-outside-toplevel
+
         soup = BeautifulSoup(file_.read_text(encoding="utf-8"), "html.parser")
 
         # parse metadata and convert it to the intermediate format
@@ -7,8 +7,7 @@ import datetime as dt
 from pathlib import Path
 import re
 import logging
-
-import frontmatter
+import os
 
 import common
 
@@ -36,15 +35,30 @@ def normalize_obsidian_tag(tag: str) -> str:
     '1984_'
     >>> normalize_obsidian_tag("y1984")
     'y1984'
+    >>> normalize_obsidian_tag("c++")
+    'candand'
     """
     # substite + with 'and'
-    valid_char_tag = re.compile(r"[+]", re.UNICODE).sub("and", tag)
+    valid_char_tag = tag.replace("+", "and")
     valid_char_tag = OBSIDIAN_TAG_REGEX.sub("_", valid_char_tag)
     if valid_char_tag.isdigit():
         valid_char_tag += "_"
     return valid_char_tag
 
 
+def add_frontmatter(body: str, **metadata) -> str:
+    """
+    Prepend the metadata as YAML frontmatter to the body.
+
+    >>> add_frontmatter("body", tags=["a"])
+    '---\\ntags:\\n- a\\n---\\n\\nbody'
+    """
+    # python-frontmatter is slow to import and only needed for frontmatter output
+    import frontmatter  # pylint: disable=import-outside-toplevel
+
+    return frontmatter.dumps(frontmatter.Post(body, **metadata))
+
+
 @dataclasses.dataclass
 class NoteLink:
     """Represents an internal link from one note to another note."""
@@ -130,9 +144,14 @@ class Note:
         """
         return self.original_id or self.title
 
-    def time_from_file(self, file_: Path):
-        self.created = common.timestamp_to_datetime(file_.stat().st_ctime)
-        self.updated = common.timestamp_to_datetime(file_.stat().st_mtime)
+    def time_from_file(self, item: Path | os.DirEntry | os.stat_result):
+        """
+        Take the creation and modification time from a file.
+        Provide the stat result or the directory entry if it's available already.
+        """
+        stat_result = item if isinstance(item, os.stat_result) else item.stat()
+        self.created = common.timestamp_to_datetime(stat_result.st_ctime)
+        self.updated = common.timestamp_to_datetime(stat_result.st_mtime)
 
     def is_empty(self) -> bool:
         return not self.body.strip() and not self.tags and not self.resources
@@ -165,8 +184,7 @@ class Note:
                         case _:
                             if (value := getattr(self, field.name)) is not None:
                                 metadata[field.name] = value
-                post = frontmatter.Post(body, **metadata)
-                body = frontmatter.dumps(post)
+                body = add_frontmatter(body, **metadata)
             case "joplin":
                 # https://joplinapp.org/help/dev/spec/interop_with_frontmatter/
                 # Arbitrary metadata will be ignored.
@@ -188,8 +206,7 @@ class Note:
                 for key in supported_keys:
                     if (value := getattr(self, key)) is not None:
                         metadata[key] = value
-                post = frontmatter.Post(body, **metadata)
-                body = frontmatter.dumps(post)
+                body = add_frontmatter(body, **metadata)
             case "obsidian":
                 # frontmatter format:
                 # https://help.obsidian.md/Editing+and+formatting/Properties#Property+format
@@ -198,17 +215,15 @@ class Note:
                     metadata["tags"] = [
                         normalize_obsidian_tag(tag.title) for tag in self.tags
                     ]
-                    post = frontmatter.Post(body, **metadata)
-                    body = frontmatter.dumps(post)
+                    body = add_frontmatter(body, **metadata)
             case "qownnotes":
                 # space separated tags, as supported by:
                 # - https://github.com/qownnotes/scripts/tree/master/epsilon-notes-tags
                 # - https://github.com/qownnotes/scripts/tree/master/yaml-nested-tags
                 if self.tags:
-                    post = frontmatter.Post(
+                    body = add_frontmatter(
                         body, tags=" ".join([tag.title for tag in self.tags])
                     )
-                    body = frontmatter.dumps(post)
         return body
 
 
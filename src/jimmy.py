@@ -5,7 +5,6 @@ import logging
 from pathlib import Path
 import sys
 
-import pypandoc
 from rich import print  # pylint: disable=redefined-builtin
 from rich.logging import RichHandler
 from rich.tree import Tree
@@ -109,6 +108,8 @@ def get_jimmy_version():
 
 
 def get_pandoc_version():
+    import pypandoc  # pylint: disable=import-outside-toplevel
+
     try:
         return pypandoc.get_pandoc_version()
     except OSError:
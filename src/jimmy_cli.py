@@ -3,6 +3,7 @@
 import argparse
 import datetime
 import logging
+import multiprocessing
 from pathlib import Path
 
 import common
@@ -42,6 +43,26 @@ def relative_path(path: str | Path | None) -> Path | None:
     return path_to_check
 
 
+def positive_int(value: str) -> int:
+    """
+    Checks if a value is a positive integer.
+
+    >>> positive_int("2")
+    2
+    >>> positive_int("0")
+    Traceback (most recent call last):
+    ...
+    argparse.ArgumentTypeError: Please specify a positive integer.
+    """
+    try:
+        number = int(value)
+    except ValueError:
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError("Please specify a positive integer.")
+    return number
+
+
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument(
@@ -95,6 +116,13 @@ def main():
         "--local-resource-folder. "
         "Relative to the location of the corresponding note.",
     )
+    parser.add_argument(
+        "--jobs",
+        type=positive_int,
+        default=1,
+        help="Number of processes to convert the notes in parallel. "
+        "Only supported by some formats.",
+    )
     parser.add_argument(
         "--print-tree",
         action="store_true",
@@ -142,4 +170,6 @@ def main():
 
 
 if __name__ == "__main__":
+    # needed for the process pools in the pyinstaller executables
+    multiprocessing.freeze_support()
     main()
@@ -1,30 +1,36 @@
 """Common Markdown functions."""
 
 from dataclasses import dataclass, field
+import functools
+import json
 import logging
+import multiprocessing.util
+import os
 from pathlib import Path
 import re
-
-import markdown
-from markdown.treeprocessors import Treeprocessor
-from markdown.extensions import Extension
-import pypandoc
+import socket
+import subprocess
+import time
+from typing import Iterator
+import urllib.error
+import urllib.request
 
 
 LOGGER = logging.getLogger("jimmy")
 
 
 def split_h1_title_from_body(markdown_: str) -> tuple[str, str]:
-    # TODO: doctest
-    try:
-        title, body = markdown_.split("\n", maxsplit=1)
-    except ValueError:
-        title = markdown_
-        body = ""
+    """
+    >>> split_h1_title_from_body("# Title\\n\\nbody\\nmore")
+    ('Title', 'body\\nmore')
+    >>> split_h1_title_from_body("## Only title")
+    ('Only title', '')
+    """
+    title, _, body = markdown_.partition("\n")
     return title.lstrip("# "), body.lstrip()
 
 
-@dataclass
+@dataclass(slots=True)
 class MarkdownTable:
     """Construct a Markdown table from lists."""
 
@@ -33,149 +39,423 @@ class MarkdownTable:
     caption: str = ""
 
     def create_md(self) -> str:
-        # column sanity check
-        columns = [len(row) for row in self.header_rows + self.data_rows]
-        if len(set(columns)) not in (0, 1):
-            LOGGER.warning(f"Amount of columns differs: {columns}")
-
-        def create_md_row(cells: list[str]) -> str:
-            return "| " + " | ".join(cells) + " |"
-
-        rows_md = []
-        for row in self.header_rows:
-            rows_md.append(create_md_row(row))
+        """
+        >>> MarkdownTable([["a", "b"]], [["1", "2"], ["3", "4"]], "cap").create_md()
+        'cap\\n\\n| a | b |\\n| --- | --- |\\n| 1 | 2 |\\n| 3 | 4 |'
+        """
+        rows = self.header_rows + self.data_rows
+        # column sanity check, the list of all widths is only needed for the warning
+        if rows:
+            width = len(rows[0])
+            if any(len(row) != width for row in rows):
+                columns = [len(row) for row in rows]
+                LOGGER.warning(f"Amount of columns differs: {columns}")
+
+        rows_md = [f"| {' | '.join(row)} |" for row in self.header_rows]
         if self.header_rows:
-            separator = ["---"] * len(self.header_rows[0])
-            rows_md.append(create_md_row(separator))
-        for row in self.data_rows:
-            rows_md.append(create_md_row(row))
+            rows_md.append(f"| {' | '.join(['---'] * len(self.header_rows[0]))} |")
+        rows_md.extend(f"| {' | '.join(row)} |" for row in self.data_rows)
 
         caption = self.caption + "\n\n" if self.caption else ""
         return caption + "\n".join(rows_md)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class MarkdownLink:
     """
     Represents a markdown link:
     - link: https://www.markdownguide.org/basic-syntax/#links
     - image: https://www.markdownguide.org/basic-syntax/#images-1
-    """
 
-    # TODO: doctest
+    >>> link = MarkdownLink("text", "https://duckduckgo.com")
+    >>> link.is_web_link, link.is_mail_link
+    (True, False)
+    >>> from dataclasses import replace
+    >>> replace(link, url="mailto:a@b.c").is_mail_link
+    True
+    >>> str(MarkdownLink("text", "image.png", "title", is_image=True))
+    '![text](image.png "title")'
+    """
 
     text: str = ""
     url: str = ""
     title: str = ""
     is_image: bool = False
+    # Derived from the other fields. The link is immutable,
+    # so they are computed only once.
+    is_web_link: bool = field(init=False, repr=False, compare=False)
+    is_mail_link: bool = field(init=False, repr=False, compare=False)
+    markdown: str = field(init=False, repr=False, compare=False)
 
-    @property
-    def is_web_link(self) -> bool:
+    def __post_init__(self):
         # not robust, but sufficient for now
-        return self.url.startswith("http")
-
-    @property
-    def is_mail_link(self) -> bool:
-        return self.url.startswith("mailto:")
-
-    def __str__(self) -> str:
+        is_web_link = self.url.startswith(("http://", "https://"))
+        object.__setattr__(self, "is_web_link", is_web_link)
+        object.__setattr__(self, "is_mail_link", self.url.startswith("mailto:"))
         prefix = "!" if self.is_image else ""
         title = "" if not self.title else f' "{self.title}"'
-        return f"{prefix}[{self.text}]({self.url}{title})"
+        object.__setattr__(
+            self, "markdown", f"{prefix}[{self.text}]({self.url}{title})"
+        )
+
+    def __str__(self) -> str:
+        return self.markdown
 
     def reformat(self) -> str:
         if not self.url:
             return f"<{self.text}>"
         if self.is_web_link and self.text == self.url:
             return f"<{self.url}>"
-        prefix = "!" if self.is_image else ""
-        title = "" if not self.title else f' "{self.title}"'
-        return f"{prefix}[{self.text}]({self.url}{title})"
-
-
-class LinkExtractor(Treeprocessor):
-    # We need to unescape manually. Reference: "UnescapeTreeprocessor"
-    # https://github.com/Python-Markdown/markdown/blob/3.6/markdown/treeprocessors.py#L454
-    RE = re.compile(rf"{markdown.util.STX}(\d+){markdown.util.ETX}")
-
-    def _unescape(self, m: re.Match[str]) -> str:
-        return "\\" + chr(int(m.group(1)))
-
-    def unescape(self, text: str) -> str:
-        return self.RE.sub(self._unescape, text)
-
-    def run(self, root):
-        # pylint: disable=no-member
-        # TODO: Find a better way.
-        self.md.images = []
-        self.md.links = []
-        for image in root.findall(".//img"):
-            self.md.images.append(
-                MarkdownLink(
-                    self.unescape(image.get("alt")), image.get("src"), is_image=True
-                )
-            )
-        for link in root.findall(".//a"):
-            url = link.get("href")
-            if (title := link.get("title")) is not None:
-                # TODO: This is not robust against titles with quotation marks.
-                if url:
-                    url += f' "{title}"'
-                else:
-                    url = title  # don't add a title if there is no url
-            self.md.links.append(MarkdownLink(link.text, url))
-
-
-class LinkExtractorExtension(Extension):
-    def extendMarkdown(self, md):  # noqa: N802
-        link_extension = LinkExtractor(md)
-        md.treeprocessors.register(link_extension, "link_extension", 15)
+        return self.markdown
+
+
+# Regexes are compiled once and reused for all notes. Parsing the complete
+# markdown document only to extract the links would be much slower.
+# Code spans and code blocks are matched, too, to skip the links inside.
+MARKDOWN_LINK_REGEX = re.compile(
+    # All matches start with one of these characters. Checking them first is
+    # much faster than trying each alternative at each position.
+    r"(?=[ \t\n`~\\<!\[])(?:"
+    # fenced code block, an unclosed block ends at the end of the document
+    r"(?P<code>(?<![^\n])[ ]{0,3}(?P<fence>`{3,}|~{3,})[^`\n]*(?![^\n])"
+    r".*?(?:\n[ ]{0,3}(?P=fence)|\Z)"
+    # indented code block, it follows a blank line and can contain blank lines
+    # Inside of lists, it's a continuation of the list item, see find_link_matches().
+    r"|(?P<indented_code>(?:\A|(?<![^\n])[ \t]*\n)"
+    r"(?:(?:[ ]{4}|\t)[^\n]*(?:\n|\Z)|[ \t]*\n(?=[ ]{4}|\t))+)"
+    # code span, it ends at a paragraph break like in CommonMark
+    r"|(?P<backticks>`+)(?!`)(?:[^\n]|\n(?![ \t]*\n))*?(?<!`)(?P=backticks)(?!`))"
+    # escaped character, like "\[" that doesn't start a link
+    r"|(?P<escape>\\[\\\[\]`!])"
+    # autolink: <https://example.com> or <mail@example.com>
+    r"|<(?:(?P<autolink>(?i:https?|ftp)://[^\s<>]+)"
+    r"|(?i:mailto:)?(?P<automail>[^\s<>@!]+@[^\s<>@]+))>"
+    # The text can contain a nested link, like an image inside a link.
+    r"|(?P<image>!)?\[(?P<text>(?:\\.|[^\[\]\\]|\[(?:\\.|[^\[\]\\])*\])*)\]"
+    # inline link: [text](url "title")
+    # The url is found by find_url_end(), since it can contain nested parentheses.
+    r"(?:(?P<inline>\()"
+    # reference link: [text][label]
+    r"|\[(?P<label>(?:\\.|[^\[\]\\])*)\]"
+    # shortcut reference link: [text]
+    # Exclude reference definitions and wikilinks like "[[note]]".
+    r"|(?<!\]\])(?![:(])))",
+    re.DOTALL,
+)
+# line of a list item or indented line, see find_link_matches()
+LIST_CONTENT_LINE_REGEX = re.compile(r"[ \t]|(?:[-*+]|\d{1,9}[.)])(?:[ \t]|\Z)")
+URL_SPECIAL_CHARACTER_REGEX = re.compile(r"[()\\\n]")
+# Only quoted titles are supported, like in Python-Markdown.
+LINK_TITLE_REGEX = re.compile(r"""\s+(?:"([^"]*)"|'([^']*)')\Z""")
+SIMPLE_URL_REGEX = re.compile(r"[^()\\\n]*\)")
+MARKDOWN_REFERENCE_DEFINITION_REGEX = re.compile(
+    r"^ {0,3}\[((?:\\.|[^\[\]\\])+)\]:[ \t]*<?([^\s>]+)>?", re.MULTILINE
+)
 
 
-MD = markdown.Markdown(extensions=[LinkExtractorExtension()])
+def normalize_reference_label(label: str) -> str:
+    """Reference labels are case-insensitive and whitespace is collapsed."""
+    return " ".join(label.lower().split())
 
 
 def get_markdown_links(text: str) -> list[MarkdownLink]:
     """
     >>> get_markdown_links("![](image.png)")
-    [MarkdownLink(text='', url='image.png', is_image=True)]
+    [MarkdownLink(text='', url='image.png', title='', is_image=True)]
     >>> get_markdown_links("![abc](image (1).png)")
-    [MarkdownLink(text='abc', url='image (1).png', is_image=True)]
+    [MarkdownLink(text='abc', url='image (1).png', title='', is_image=True)]
     >>> get_markdown_links("[mul](tiple) [links](...)") # doctest: +NORMALIZE_WHITESPACE
-    [MarkdownLink(text='mul', url='tiple', is_image=False),
-     MarkdownLink(text='links', url='...', is_image=False)]
+    [MarkdownLink(text='mul', url='tiple', title='', is_image=False),
+     MarkdownLink(text='links', url='...', title='', is_image=False)]
     >>> get_markdown_links("![desc \\[reference\\]](Image.png){#fig:leanCycle}")
-    [MarkdownLink(text='desc \\\\[reference\\\\]', url='Image.png', is_image=True)]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [MarkdownLink(text='desc \\\\[reference\\\\]', url='Image.png', title='',
+                  is_image=True)]
     >>> get_markdown_links('[link](internal "Example Title")')
-    [MarkdownLink(text='link', url='internal "Example Title"', is_image=False)]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [MarkdownLink(text='link', url='internal "Example Title"', title='',
+                  is_image=False)]
     >>> get_markdown_links('[link](#internal)')
-    [MarkdownLink(text='link', url='#internal', is_image=False)]
+    [MarkdownLink(text='link', url='#internal', title='', is_image=False)]
     >>> get_markdown_links('[link](:/custom)')
-    [MarkdownLink(text='link', url=':/custom', is_image=False)]
+    [MarkdownLink(text='link', url=':/custom', title='', is_image=False)]
     >>> get_markdown_links('[weblink](https://duckduckgo.com)')
-    [MarkdownLink(text='weblink', url='https://duckduckgo.com', is_image=False)]
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [MarkdownLink(text='weblink', url='https://duckduckgo.com', title='',
+                  is_image=False)]
+    >>> get_markdown_links("`[code](span)` and\\n```\\n[code](block)\\n```")
+    []
+    >>> get_markdown_links("![ref][Label]\\n\\n[label]: image.png")
+    [MarkdownLink(text='ref', url='image.png', title='', is_image=True)]
+    >>> get_markdown_links("[undefined][label]")
+    []
+    >>> get_markdown_links("[nested](a(b(c)).png) [unbalanced](a(b)")
+    [MarkdownLink(text='nested', url='a(b(c)).png', title='', is_image=False)]
+    >>> get_markdown_links("It`s a [link](a.md).\\n\\nAnother`s note")
+    [MarkdownLink(text='link', url='a.md', title='', is_image=False)]
+    >>> get_markdown_links("```\\n[code](block)\\n\\n```\\n[link](a.md)")
+    [MarkdownLink(text='link', url='a.md', title='', is_image=False)]
+    >>> get_markdown_links("[a](<my file.png>)")
+    [MarkdownLink(text='a', url='my file.png', title='', is_image=False)]
+    >>> get_markdown_links("[![img](a.png)](https://x)")
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [MarkdownLink(text='![img](a.png)', url='https://x', title='', is_image=False),
+     MarkdownLink(text='img', url='a.png', title='', is_image=True)]
+    >>> get_markdown_links("[a](b 'title') ![c](d.png 'title')")
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [MarkdownLink(text='a', url='b "title"', title='', is_image=False),
+     MarkdownLink(text='c', url='d.png', title='title', is_image=True)]
+    >>> get_markdown_links("[ref] [undefined]\\n\\n[ref]: target.md")
+    [MarkdownLink(text='ref', url='target.md', title='', is_image=False)]
+    >>> get_markdown_links("<https://x.org> <mail@x.org>")
+    ... # doctest: +NORMALIZE_WHITESPACE
+    [MarkdownLink(text='https://x.org', url='https://x.org', title='',
+                  is_image=False),
+     MarkdownLink(text='mail@x.org', url='mailto:mail@x.org', title='',
+                  is_image=False)]
+    >>> get_markdown_links("\\\\[not](link) \\\\\\\\[link](a.md)")
+    [MarkdownLink(text='link', url='a.md', title='', is_image=False)]
+    >>> get_markdown_links("text\\n\\n    [code](block)\\n\\n[link](a.md)")
+    [MarkdownLink(text='link', url='a.md', title='', is_image=False)]
+    >>> get_markdown_links("- item\\n\\n    [link](a.md)")
+    [MarkdownLink(text='link', url='a.md', title='', is_image=False)]
+    """
+    # Fast path: Every link needs an inline url, a reference definition
+    # or angle brackets.
+    if "](" not in text and "]:" not in text and "<" not in text:
+        return []
+    references = get_reference_definitions(text)
+    links = []
+    for match, url in find_link_matches(MARKDOWN_LINK_REGEX, text, references):
+        if (link := match_to_markdown_link(match, url)) is not None:
+            links.append(link)
+    return links
+
+
+def find_url_end(text: str, start: int) -> int | None:
+    """
+    Find the closing parenthesis of an inline link url, which starts at "start".
+    Nested parentheses need to be balanced and backslashes escape a character.
+    Only the special characters are checked, so long urls are skipped quickly.
+
+    >>> find_url_end("(a(b(c))d) e", 1)
+    9
+    >>> find_url_end("(a\\\\)b) e", 1)
+    5
+    >>> find_url_end("(a(b) e", 1) is None
+    True
+    >>> find_url_end("(a\\nb)", 1) is None
+    True
     """
-    # Based on: https://stackoverflow.com/a/29280824/7410886
-    # pylint: disable=no-member
-    MD.convert(text)
-    try:
-        md_images = [*MD.images]  # new list, because it gets cleared
-        MD.images.clear()
-    except AttributeError:
-        md_images = []
-    try:
-        md_links = [*MD.links]
-        MD.links.clear()
-    except AttributeError:
-        md_links = []
-    return md_images + md_links
+    if (simple_url := SIMPLE_URL_REGEX.match(text, start)) is not None:
+        return simple_url.end() - 1  # fast path: no parentheses and escapes
+    depth = 0
+    index = start
+    while (match := URL_SPECIAL_CHARACTER_REGEX.search(text, index)) is not None:
+        index = match.end()
+        match match.group():
+            case "\\":
+                index += 1  # skip the escaped character
+            case "(":
+                depth += 1
+            case ")":
+                if depth == 0:
+                    return match.start()
+                depth -= 1
+            case _:  # newline
+                return None
+    return None
+
+
+def find_link_matches(
+    regex: re.Pattern[str],
+    text: str,
+    references: dict[str, str],
+    wikilinks: "WikilinkScanner | None" = None,
+) -> Iterator[tuple[re.Match[str], str | None]]:
+    """
+    Find the matches of a regex containing MARKDOWN_LINK_REGEX.
+    The url of inline and reference links is provided, too. For other matches,
+    it's None. Escaped characters and undefined references aren't yielded.
+    If the regex contains a "wikilink" group for "[[", the wikilinks are
+    parsed by the scanner and not yielded.
+    """
+    position = 0
+    while (match := regex.search(text, position)) is not None:
+        if wikilinks is not None and match["wikilink"] is not None:
+            if (end := wikilinks.parse(match.end() - 2)) is None:
+                position = match.start() + 1  # not a link
+            else:
+                position = end
+            continue
+        if match["escape"] is not None:
+            position = match.end()
+            continue
+        if match["indented_code"] is not None and is_list_continuation(
+            text, match.start()
+        ):
+            # Not code. Continue at the next character to find the links inside.
+            position = match.start() + 1
+            continue
+        if (link_text := match["text"]) is None:
+            position = match.end()
+            url = None
+        elif match["inline"] is not None:
+            if (url_end := find_url_end(text, match.end())) is None:
+                # Not a link. Continue at the next character, like finditer() would.
+                position = match.start() + 1
+                continue
+            position = url_end + 1
+            url = text[match.end() : url_end]
+        else:
+            # reference link, "[text]" and "[text][]" are shortcuts for "[text][text]"
+            label = normalize_reference_label(match["label"] or link_text)
+            if (url := references.get(label)) is None:
+                position = match.start() + 1  # not a link
+                continue
+            position = match.end()
+        if link_text is not None and ("](" in link_text or "][" in link_text):
+            # Continue inside the link text to find nested links.
+            position = match.start("text")
+        yield match, url
+
+
+def is_list_continuation(text: str, start: int) -> bool:
+    """
+    Check whether an indented block at "start" continues a list item.
+    This is the case if the previous non-blank line is a list item or indented.
 
+    >>> is_list_continuation("- item\\n\\n    more", 6)
+    True
+    >>> is_list_continuation("text\\n\\n    code", 4)
+    False
+    """
+    line_end = start
+    while line_end > 0 and text[line_end - 1] in " \t\n":
+        line_end -= 1
+    if line_end == 0:
+        return False
+    line_start = text.rfind("\n", 0, line_end) + 1
+    return LIST_CONTENT_LINE_REGEX.match(text, line_start, line_end) is not None
 
-WIKILINK_LINK_REGEX = re.compile(r"(!)?\[\[(.+?)(?:\|(.+?))?\]\]")
 
+def split_link_destination(destination: str) -> tuple[str, str]:
+    """
+    Split the destination of an inline link into url and title.
+
+    >>> split_link_destination(' <my file.png> "title" ')
+    ('my file.png', 'title')
+    >>> split_link_destination("image (1).png 'title'")
+    ('image (1).png', 'title')
+    >>> split_link_destination("image (1).png")
+    ('image (1).png', '')
+    """
+    destination = destination.strip()
+    title = ""
+    if destination.endswith(("'", '"')) and (
+        match := LINK_TITLE_REGEX.search(destination)
+    ):
+        title = match[1] if match[1] is not None else match[2]
+        destination = destination[: match.start()]
+    if destination.startswith("<") and destination.endswith(">"):
+        destination = destination[1:-1]
+    return destination, title
+
+
+def get_reference_definitions(text: str) -> dict[str, str]:
+    references: dict[str, str] = {}
+    if "]:" in text:
+        for label, url in MARKDOWN_REFERENCE_DEFINITION_REGEX.findall(text):
+            references.setdefault(normalize_reference_label(label), url)
+    return references
+
+
+def match_to_markdown_link(
+    match: re.Match[str], url: str | None
+) -> MarkdownLink | None:
+    """Create a link from a match of MARKDOWN_LINK_REGEX and its url."""
+    if (autolink := match["autolink"]) is not None:
+        return MarkdownLink(autolink, autolink)
+    if (automail := match["automail"]) is not None:
+        return MarkdownLink(automail, f"mailto:{automail}")
+    if url is None:
+        return None  # not a link, like code
+    link_text = match["text"]
+    if match["inline"] is None:  # reference link
+        return MarkdownLink(link_text, url, is_image=match["image"] is not None)
+    url, title = split_link_destination(url)
+    if match["image"] is not None:
+        return MarkdownLink(link_text, url, title, is_image=True)
+    # The title of links is kept in the url, like in the previous implementation.
+    if title:
+        url = f'{url} "{title}"'
+    return MarkdownLink(link_text, url)
+
+
+class WikilinkScanner:
+    """
+    Parse wikilinks like "[[url]]", "[[url|description]]" or "![[image]]".
+    Links don't span multiple lines. The links need to be parsed at increasing
+    positions. The next delimiters are cached, since they are the same for
+    many "[[" without closing brackets. This keeps the scan linear. A non-greedy
+    regex would scan to the end of the line for each "[[".
+    """
 
-def get_wikilink_links(text: str) -> list:
-    return WIKILINK_LINK_REGEX.findall(text)
+    def __init__(self, text: str):
+        self.text = text
+        self.links: list[tuple[str, str, str]] = []
+        # next position of a delimiter, -1 if there is none
+        self.next_positions: dict[str, int] = {}
+
+    def find(self, delimiter: str, start: int) -> int:
+        position = self.next_positions.get(delimiter)
+        if position is None or position != -1 and position < start:
+            position = self.text.find(delimiter, start)
+            self.next_positions[delimiter] = position
+        return position
+
+    def parse(self, start: int) -> int | None:
+        """
+        Parse the wikilink at the "[[" at start and append it to the links.
+        Return the end of the link or None if there is no link.
+        """
+        # The url contains at least one character.
+        end = self.find("]]", start + 3)
+        if end == -1:
+            return None
+        line_end = self.find("\n", start + 2)
+        if line_end != -1 and line_end < end:
+            return None
+        image = "!" if start > 0 and self.text[start - 1] == "!" else ""
+        url_end = end
+        description = ""
+        pipe = self.find("|", start + 3)
+        if pipe != -1 and pipe < end:
+            # The description contains at least one character, too.
+            description_end = self.find("]]", pipe + 2)
+            if description_end != -1 and (line_end == -1 or description_end < line_end):
+                url_end = pipe
+                description = self.text[pipe + 1 : description_end]
+                end = description_end
+        self.links.append((image, self.text[start + 2 : url_end], description))
+        return end + 2
+
+
+def get_wikilink_links(text: str) -> list[tuple[str, str, str]]:
+    """
+    >>> get_wikilink_links("[[a]] ![[b|c]] [[d|]] [[e\\nf]] [[g|h|i]]")
+    [('', 'a', ''), ('!', 'b', 'c'), ('', 'd|', ''), ('', 'g', 'h|i')]
+    >>> get_wikilink_links("[[a|]]] [[]]]")
+    [('', 'a', ']'), ('', ']', '')]
+    """
+    scanner = WikilinkScanner(text)
+    start = text.find("[[")
+    while start != -1:
+        if (end := scanner.parse(start)) is None:
+            start = text.find("[[", start + 1)
+        else:
+            start = text.find("[[", end)
+    return scanner.links
 
 
 def get_inline_tags(text: str, start_characters: list[str]) -> list[str]:
@@ -190,18 +470,142 @@ def get_inline_tags(text: str, start_characters: list[str]) -> list[str]:
     ['tag']
     >>> sorted(get_inline_tags("#tag @abc", ["#", "@"]))
     ['abc', 'tag']
+    >>> sorted(get_inline_tags("##tag #@ #", ["#", "@"]))
+    ['#tag']
     """
     # TODO: can possibly be combined with todoist.split_labels()
+    if not any(character in text for character in start_characters):
+        return []  # fast path: no tags
+    start_characters_string = "".join(start_characters)
+    return list(
+        {
+            tag
+            for tag in get_inline_tag_regex(start_characters_string).findall(text)
+            # exclude words like "###"
+            if tag.lstrip(start_characters_string)
+        }
+    )
+
+
+@functools.lru_cache
+def get_inline_tag_regex(start_characters: str) -> re.Pattern[str]:
+    """
+    Match words starting with one of the characters. Capture the rest.
+    The regex starts with the characters, so that the regex engine can skip
+    to them quickly. The start of the word is checked afterwards.
+    """
+    characters = re.escape(start_characters)
+    return re.compile(rf"[{characters}](?<!\S[{characters}])(\S+)")
+
+
+# Obsidian flavored markdown: https://help.obsidian.md/Editing+and+formatting
+# All elements are found in a single pass. The tag only looks ahead to find
+# links in the same word, like "#tag[[link]]". Only the start of wikilinks is
+# matched. They are parsed by WikilinkScanner.
+NOTE_SCAN_REGEX = re.compile(
+    # the start characters of MARKDOWN_LINK_REGEX and "#"
+    r"(?=[ \t\n`~\\<!\[#])(?:"
+    rf"{MARKDOWN_LINK_REGEX.pattern}"
+    r"|(?P<wikilink>!?\[\[)"
+    r"|(?<!\S)#(?=(?P<tag>\S+)))",
+    re.DOTALL,
+)
+
+
+@dataclass
+class NoteScan:
+    """Links and tags of a note."""
+
+    # same format as get_wikilink_links()
+    wikilinks: list[tuple[str, str, str]] = field(default_factory=list)
+    markdown_links: list[MarkdownLink] = field(default_factory=list)
+    inline_tags: list[str] = field(default_factory=list)
+
+
+def scan_note(text: str) -> NoteScan:
+    """
+    Find wikilinks, markdown links and "#" tags in a single pass.
+    Tags and links in code are ignored.
+
+    >>> scan_note("#tag ![[image.png]] [link](note.md) `#code` ###")
+    ... # doctest: +NORMALIZE_WHITESPACE
+    NoteScan(wikilinks=[('!', 'image.png', '')],
+             markdown_links=[MarkdownLink(text='link', url='note.md', title='',
+                                          is_image=False)],
+             inline_tags=['tag'])
+    >>> scan_note("#tag[[note|alias]]")  # doctest: +NORMALIZE_WHITESPACE
+    NoteScan(wikilinks=[('', 'note', 'alias')], markdown_links=[],
+             inline_tags=['tag[[note|alias]]'])
+    >>> scan_note("Don`t forget [[Note A]] and #todo\\n\\nSee also `x")
+    NoteScan(wikilinks=[('', 'Note A', '')], markdown_links=[], inline_tags=['todo'])
+    """
+    scan = NoteScan()
+    if "[" not in text and "#" not in text and "<" not in text:
+        return scan  # fast path: no links and tags
+    references = get_reference_definitions(text)
+    wikilinks = WikilinkScanner(text)
     tags = set()
-    for word in text.split():
-        if (
-            any(word.startswith(char) for char in start_characters)
-            and len(word) > 1
+    for match, url in find_link_matches(NOTE_SCAN_REGEX, text, references, wikilinks):
+        if (tag := match["tag"]) is not None:
             # exclude words like "###"
-            and any(char not in start_characters for char in word)
-        ):
-            tags.add(word[1:])
-    return list(tags)
+            if tag.strip("#"):
+                tags.add(tag)
+        elif (link := match_to_markdown_link(match, url)) is not None:
+            scan.markdown_links.append(link)
+    scan.wikilinks = wikilinks.links
+    scan.inline_tags = list(tags)
+    return scan
+
+
+# Same boundary as python-frontmatter.
+FRONTMATTER_BOUNDARY_REGEX = re.compile(r"^-{3,}\s*$", re.MULTILINE)
+
+
+def split_frontmatter(text: str) -> tuple[str, str]:
+    """
+    Split the YAML frontmatter from the body without parsing it.
+    Whitespace is stripped like in python-frontmatter.
+
+    >>> split_frontmatter("---\\ntags: [a]\\n---\\n\\nbody\\n")
+    ('\\ntags: [a]\\n', 'body')
+    >>> split_frontmatter(" body\\n---\\n")
+    ('', 'body\\n---')
+    >>> split_frontmatter("---\\nno closing delimiter")
+    ('', '---\\nno closing delimiter')
+    """
+    text = text.strip()
+    if not text.startswith("---"):
+        return "", text
+    parts = FRONTMATTER_BOUNDARY_REGEX.split(text, 2)
+    if len(parts) != 3 or parts[0]:
+        return "", text
+    return parts[1], parts[2].strip()
+
+
+def extract_frontmatter_tags(frontmatter_: str) -> list[str]:
+    """
+    Get the tags of a YAML frontmatter. The YAML is only parsed if needed.
+
+    >>> extract_frontmatter_tags("tags: [a, b]")
+    ['a', 'b']
+    >>> extract_frontmatter_tags("tags: single")
+    ['single']
+    >>> extract_frontmatter_tags("title: no tags")
+    []
+    """
+    if "tags" not in frontmatter_:
+        return []
+    import yaml  # pylint: disable=import-outside-toplevel
+
+    # The C loader is much faster, but only available if libyaml is installed.
+    loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+    metadata = yaml.load(frontmatter_, Loader=loader)
+    if not isinstance(metadata, dict) or not metadata.get("tags"):
+        return []
+    tags = metadata["tags"]
+    if isinstance(tags, list):
+        return [str(tag) for tag in tags]
+    return [str(tags)]
 
 
 # markdown output formats:
@@ -218,20 +622,205 @@ PANDOC_OUTPUT_FORMAT = (
 # fmt:on
 
 
+class PandocServer:
+    """
+    A pandoc server that is started once and reused for all conversions.
+    Starting a pandoc process for each note is much slower.
+    See: https://pandoc.org/pandoc-server.html
+    """
+
+    def __init__(self):
+        self.process: subprocess.Popen | None = None
+        # ID of the process that started the server
+        self.pid = 0
+        self.url = ""
+        # False if the server can't be used, for example with pandoc < 3.0
+        self.available = True
+        # The server is local. Don't send the notes to a proxy.
+        self.opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def start(self):
+        # pypandoc is imported only when needed, since the import is slow
+        import pypandoc  # pylint: disable=import-outside-toplevel
+
+        # atexit handlers don't run in the worker processes of a process pool.
+        # Finalizers run at the exit of all processes.
+        multiprocessing.util.Finalize(self, self.stop, exitpriority=0)
+        # Another process can take the free port before pandoc binds it.
+        # Try again with a new port in this case.
+        for _ in range(3):
+            with socket.socket() as sock:
+                sock.bind(("127.0.0.1", 0))
+                port = sock.getsockname()[1]
+            # fmt: off
+            # The server is running until stop() is called.
+            self.process = subprocess.Popen(  # pylint: disable=consider-using-with
+                [
+                    pypandoc.get_pandoc_path(), "server",
+                    "--port", str(port),
+                    # The default of two seconds is too short for big notes.
+                    "--timeout", "600",
+                ],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            )
+            # fmt: on
+            self.pid = os.getpid()
+            if self.wait_for_server(self.process, port):
+                self.url = f"http://127.0.0.1:{port}"
+                return
+            self.stop()
+        LOGGER.debug("Pandoc server isn't available. Using pandoc directly.")
+        self.available = False
+
+    @staticmethod
+    def wait_for_server(process: subprocess.Popen, port: int) -> bool:
+        for _ in range(100):
+            if process.poll() is not None:
+                # pandoc exited, i. e. the server is not supported
+                # or the port is taken
+                return False
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return True
+            except OSError:
+                time.sleep(0.05)
+        return False
+
+    def stop(self):
+        if self.process is not None:
+            # Forked worker processes inherit the server of the parent process.
+            # Only the process that started the server stops it.
+            if self.pid == os.getpid():
+                self.process.terminate()
+                self.process.wait()
+            self.process = None
+
+    def convert_text(self, text: str, format_: str) -> str | None:
+        """Convert a text to markdown. Return None if the server failed."""
+        if not self.available:
+            return None
+        if self.process is None:
+            self.start()
+            if not self.available:
+                return None
+        # The server is always sandboxed.
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps(
+                {
+                    "text": text,
+                    "from": format_,
+                    "to": PANDOC_OUTPUT_FORMAT,
+                    "wrap": "none",
+                }
+            ).encode("utf-8"),
+            headers={"Content-Type": "application/json", "Accept": "application/json"},
+        )
+        try:
+            with self.opener.open(request) as response:
+                result = json.load(response)
+        except urllib.error.HTTPError as exc:
+            LOGGER.debug(f"Pandoc server failed: {exc}")
+            return None
+        except (OSError, ValueError) as exc:
+            # The server isn't reachable. Don't try it again for each note.
+            LOGGER.debug(f"Pandoc server isn't reachable: {exc}")
+            self.stop()
+            self.available = False
+            return None
+        if "output" not in result or result.get("base64"):
+            return None
+        return result["output"]
+
+
+PANDOC_SERVER = PandocServer()
+
+
+def pandoc_convert_text(text: str, format_: str) -> str:
+    text_md = PANDOC_SERVER.convert_text(text, format_)
+    if text_md is None:
+        # Fall back to a separate pandoc process. It gives the same result,
+        # but has better error messages.
+        import pypandoc  # pylint: disable=import-outside-toplevel
+
+        text_md = pypandoc.convert_text(
+            text,
+            PANDOC_OUTPUT_FORMAT,
+            format=format_,
+            sandbox=True,
+            extra_args=["--wrap=none"],
+            # The formats are known. Verifying them would start pandoc three times.
+            verify_format=False,
+        )
+    return text_md
+
+
+# Only short texts are cached. They are likely repeated, like templates or
+# footers. The cache takes at most about 16 MiB this way.
+MAX_CACHED_TEXT_LENGTH = 4096
+
+
+@functools.lru_cache(maxsize=4096)
+def pandoc_convert_text_cached(text: str, format_: str) -> str:
+    """Same as pandoc_convert_text(), but repeated texts are converted only once."""
+    return pandoc_convert_text(text, format_)
+
+
 def markup_to_markdown(text: str, format_: str = "html") -> str:
-    text_md = pypandoc.convert_text(
-        text,
-        PANDOC_OUTPUT_FORMAT,
-        format=format_,
-        sandbox=True,
-        extra_args=["--wrap=none"],
-    )
+    """
+    >>> markup_to_markdown("<p>a <i>b</i></p>")
+    'a *b*'
+    >>> markup_to_markdown(" \\n ")
+    ''
+    """
+    if not text or text.isspace():
+        # Nothing to convert. Empty notes and comments are common.
+        return ""
+    if len(text) <= MAX_CACHED_TEXT_LENGTH:
+        text_md = pandoc_convert_text_cached(text, format_)
+    else:
+        text_md = pandoc_convert_text(text, format_)
     if "[TABLE]" in text_md:
         LOGGER.warning("Table is too complex and can't be converted to markdown.")
     return text_md.strip()
 
 
+# Separates the texts of a batch conversion. It's kept as is by pandoc.
+PANDOC_BATCH_SEPARATOR = "JIMMYBATCHSEPARATORCD985272F78311"
+PANDOC_BATCH_SEPARATOR_REGEX = re.compile(
+    rf"^{PANDOC_BATCH_SEPARATOR}$", flags=re.MULTILINE
+)
+
+
+def markup_to_markdown_batch(texts: list[str], format_: str = "html") -> list[str]:
+    """
+    Convert multiple texts to markdown by a single pandoc call.
+    The texts need to be self-contained, i. e. all tags need to be closed.
+    Else they are converted one by one.
+
+    >>> markup_to_markdown_batch(["<b>a</b>", "", "<ul><li>b</li></ul>"])
+    ['**a**', '', '-   b']
+    >>> markup_to_markdown_batch(["<b>a", "b</b>"])
+    ['**a**', 'b']
+    """
+    if len(texts) < 2 or format_ != "html":
+        return [markup_to_markdown(text, format_) for text in texts]
+    separator = f"\n<p>{PANDOC_BATCH_SEPARATOR}</p>\n"
+    texts_md = PANDOC_BATCH_SEPARATOR_REGEX.split(
+        pandoc_convert_text(separator.join(texts), format_)
+    )
+    if len(texts_md) != len(texts):
+        # The separator got lost or merged into a text.
+        return [markup_to_markdown(text, format_) for text in texts]
+    if any("[TABLE]" in text_md for text_md in texts_md):
+        LOGGER.warning("Table is too complex and can't be converted to markdown.")
+    return [text_md.strip() for text_md in texts_md]
+
+
 def file_to_markdown(file_: Path, resource_folder: Path) -> str:
+    import pypandoc  # pylint: disable=import-outside-toplevel
+
     file_md = pypandoc.convert_file(
         file_,
         PANDOC_OUTPUT_FORMAT,
@@ -242,6 +831,9 @@ def file_to_markdown(file_: Path, resource_folder: Path) -> str:
             # don't create artificial line breaks
             "--wrap=none",
         ],
+        # The input format is taken from the suffix. Verifying it would start
+        # pandoc twice more. Invalid formats are reported by pandoc anyway.
+        verify_format=False,
     )
     if "[TABLE]" in file_md:
         LOGGER.warning("Table is too complex and can't be converted to markdown.")
@@ -5,9 +5,12 @@ from types import SimpleNamespace
 import random
 import shutil
 import unittest
+from unittest import mock
 
 from parameterized import parameterized
 
+import converter
+from formats import synology_note_station
 import jimmy
 
 
@@ -40,6 +43,7 @@ class EndToEnd(unittest.TestCase):
             global_resource_folder=None,
             local_resource_folder=Path("."),
             local_image_folder=None,
+            jobs=1,
             print_tree=False,
             exclude_notes=None,
             exclude_notes_with_tags=None,
@@ -196,6 +200,104 @@ class EndToEnd(unittest.TestCase):
 
         self.assert_dir_trees_equal(test_data_output, reference_data)
 
+    @parameterized.expand(
+        [
+            ["obsidian", "obsidian/test_1/vault"],
+            ["synology_note_station", "synology_note_station/test_4/test.nsx"],
+        ]
+    )
+    def test_parallel(self, format_, test_input):
+        """Test that the parallel conversion gives the same result as the serial."""
+        test_data = Path("test/data/test_data") / test_input
+        if not test_data.exists():
+            self.skipTest(f"No test data available at {test_data}")
+
+        test_data_outputs = []
+        for jobs in (1, 2):
+            # same uuids for both runs
+            random.seed(42)
+            test_data_output = Path("tmp_output/parallel") / f"{format_}_{jobs}"
+            shutil.rmtree(test_data_output, ignore_errors=True)
+            test_data_outputs.append(test_data_output)
+
+            self.config.input = [test_data]
+            self.config.format = format_
+            self.config.output_folder = test_data_output
+            self.config.jobs = jobs
+            jimmy.jimmy(self.config)
+
+        self.assert_dir_trees_equal(test_data_outputs[0], test_data_outputs[1])
+
+    def test_asciidoc_batch(self):
+        """Test the edge cases of the batch conversion of asciidoc files."""
+        if shutil.which("asciidoctor") is None:
+            self.skipTest("asciidoctor is not available")
+
+        test_data = Path("tmp_output/asciidoc_batch")
+        shutil.rmtree(test_data, ignore_errors=True)
+        (test_data / "input" / "sub").mkdir(parents=True)
+        (test_data / "outside").mkdir()
+        for file_, content in (
+            # same output name
+            ("input/a.adoc", "A1"),
+            ("input/a.asciidoc", "A2"),
+            ("input/sub/b.adoc", "B"),
+            ("input/c.adoc", "C"),
+            ("outside/d.adoc", "D"),
+        ):
+            (test_data / file_).write_text(content, encoding="utf-8")
+        try:
+            # symlink to a file outside of the input folder
+            (test_data / "input/d.adoc").symlink_to(
+                (test_data / "outside/d.adoc").resolve()
+            )
+        except OSError:
+            self.skipTest("Symlinks are not supported")
+
+        self.config.output_folder = test_data / "output"
+        default_converter = converter.DefaultConverter(self.config)
+        notebooks = default_converter.convert_multiple([test_data / "input"])
+
+        bodies = []
+        stack = list(notebooks)
+        while stack:
+            notebook = stack.pop()
+            bodies.extend(note.body for note in notebook.child_notes)
+            stack.extend(notebook.child_notebooks)
+        self.assertEqual(sorted(bodies), ["A1", "A2", "B", "C", "D"])
+
+    @parameterized.expand(
+        [
+            [
+                "empty_divs",
+                "<div>a</div><DIV></DIV><div ></div><div/><div>b</div>"
+                "<TABLE><TBODY><tr><td><div>x</div></td></tr></TBODY></TABLE>",
+            ],
+            [
+                "script",
+                "<script>s='<table>'</script><p>a</p><script>s='</table>'</script>"
+                "<table><tr><td><div>x</div></td></tr></table>",
+            ],
+            [
+                "comment",
+                "<!-- <table> --><p>a<br>b</p><!-- </table> -->"
+                "<table><tr><td>x</td></tr></table><P>unclosed",
+            ],
+        ]
+    )
+    def test_synology_tables(self, test_name, content_html):
+        """Test that streamlining only the tables gives the same result
+        as streamlining the whole note."""
+        with mock.patch.object(
+            synology_note_station,
+            "streamline_html",
+            synology_note_station.streamline_tables,
+        ):
+            reference = synology_note_station.convert_content(test_name, content_html)
+        self.assertEqual(
+            synology_note_station.convert_content(test_name, content_html), reference
+        )
+
     @parameterized.expand(
         [
             ["single_folder", ["default_format/arbitrary_folder"]],